@@ -0,0 +1,225 @@
+import ast
+import os
+import re
+from ast import Assign, Constant, Expr, FunctionDef, ImportFrom, Module, Name, stmt
+from typing import Iterator
+from automata import BaseType, DictHead, ErrorType, Function, Head, IterHead, ListHead, SetHead, State, TypeVariable
+from pretty_printing import Renderer
+from scope import Variable
+
+# Annotations are inserted into the original source at byte offsets taken
+# from the node positions, ast columns are UTF-8 byte offsets as well.
+
+def LineOffsets(source: bytes) -> list[int]:
+    offsets = [0]
+    for line in source.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+class Annotations:
+    # Python annotations of types, with the type variables of a renderer
+    def __init__(self, renderer: Renderer):
+        self.labels  : dict[int, list[str]] = renderer.labels
+        self.strings : dict[int, str] = {}
+        self.active  : set[int] = set()
+
+    def Of(self, state: State) -> str:
+        key = id(state)
+        text = self.strings.get(key)
+        if text is not None:
+            return text
+        if key in self.active:
+            return "object"
+        self.active.add(key)
+        parts = {self.OfHead(h) for h in state.heads}
+        parts.update(self.labels.get(key, ()))
+        self.active.discard(key)
+        text = "|".join(sorted(parts))
+        self.strings[key] = text
+        return text
+
+    def OfHead(self, head: Head) -> str:
+        if type(head) == BaseType:
+            if head.name == "module":
+                return "ModuleType"
+            return "None" if head.name == "none" else head.name
+        if type(head) == TypeVariable:
+            return head.paramName
+        if type(head) == ErrorType:
+            return "Any"
+        if type(head) == Function:
+            parameters = ", ".join(self.Of(p) or "object" for p in head.parameters)
+            return "Callable[[{}], {}]".format(parameters, self.Of(head.result) or "None")
+        if isinstance(head, IterHead):
+            values = self.Of(head.fields["values"])
+            if type(head) == ListHead:
+                return "list[{}]".format(values) if values else "list"
+            if type(head) == DictHead:
+                keys = self.Of(head.fields["keys"])
+                return "dict[{}, {}]".format(keys, values) if keys and values else "dict"
+            if type(head) == SetHead:
+                return "set[{}]".format(values) if values else "set"
+            return "Iterable[{}]".format(values) if values else "Iterable"
+        return "object"
+
+def FunctionHead(state: State) -> Function | None:
+    return next((h for h in state.heads if type(h) == Function), None)
+
+def ClosingParen(source: bytes, start: int) -> int:
+    # Only whitespace, separators and comments follow the last parameter
+    i = start
+    while source[i] != ord(")"):
+        if source[i] == ord("#"):
+            i = source.index(b"\n", i)
+        i += 1
+    return i
+
+def ParametersEnd(node: FunctionDef) -> tuple[int, int]:
+    arguments = node.args
+    nodes = arguments.posonlyargs + arguments.args + arguments.kwonlyargs + arguments.defaults
+    nodes += [n for n in arguments.kw_defaults if n is not None]
+    nodes += [n for n in (arguments.vararg, arguments.kwarg) if n is not None]
+    if not nodes:
+        return (node.lineno, node.col_offset)
+    return max((n.end_lineno, n.end_col_offset) for n in nodes) #type: ignore
+
+def Statements(statements: list[stmt]) -> Iterator[stmt]:
+    # Assignments are statements, only the bodies of statements can hold them
+    for statement in statements:
+        yield statement
+        for field in ("body", "orelse"):
+            body = getattr(statement, field, None)
+            if type(body) == list:
+                yield from Statements(body)
+
+def AnnotateSource(source: bytes, tree: Module, variables: list[Variable], annotations: Annotations) -> bytes:
+    offsets = LineOffsets(source)
+    targets = {id(n.targets[0]) for n in Statements(tree.body) if type(n) == Assign and len(n.targets) == 1 and type(n.targets[0]) == Name}
+    inserts: list[tuple[int, str]] = []
+    # The first variable of a node is the one its statement bound
+    done: set[int] = set()
+    for var in variables:
+        state = var.state
+        node = var.node
+        if id(node) in done:
+            continue
+        done.add(id(node))
+        if type(node) == FunctionDef:
+            head = FunctionHead(state)
+            if head is None:
+                continue
+            for (argument, parameter) in zip(node.args.args, head.parameters):
+                if argument.annotation is None:
+                    inserts.append((offsets[argument.end_lineno - 1] + argument.end_col_offset, ": " + (annotations.Of(parameter) or "object"))) #type: ignore
+            if node.returns is None:
+                (line, column) = ParametersEnd(node)
+                inserts.append((ClosingParen(source, offsets[line - 1] + column) + 1, " -> " + (annotations.Of(head.result) or "None")))
+        elif id(node) in targets:
+            inserts.append((offsets[node.end_lineno - 1] + node.end_col_offset, ": " + (annotations.Of(state) or "object"))) #type: ignore
+
+    # The annotations are evaluated, so they need the names Stub declares
+    prelude = Prelude(" ".join(text for (_, text) in inserts))
+    if prelude:
+        offset = PreludeOffset(source, tree, offsets)
+        text = "\n".join(prelude) + "\n"
+        if offset == len(source) and source and not source.endswith(b"\n"):
+            text = "\n" + text
+        inserts.insert(0, (offset, text))
+
+    inserts.sort(key=lambda insert: insert[0])
+    parts: list[bytes] = []
+    last = 0
+    for (offset, text) in inserts:
+        parts.append(source[last:offset])
+        parts.append(text.encode())
+        last = offset
+    parts.append(source[last:])
+    return b"".join(parts)
+
+def Stub(tree: Module, variables: list[Variable], annotations: Annotations) -> bytes:
+    # Declarations of the module-level names: every top-level function and
+    # a union of the types bound to every other name outside of functions
+    inFunctions = {id(n) for f in tree.body if type(f) == FunctionDef for n in ast.walk(f) if n is not f}
+    lines: list[str] = []
+    declared: dict[str, list[str]] = {}
+    for var in variables:
+        state = var.state
+        node = var.node
+        if type(node) == FunctionDef and id(node) not in inFunctions:
+            head = FunctionHead(state)
+            if head is None:
+                continue
+            parameters = ", ".join("{}: {}".format(a.arg, annotations.Of(p) or "object") for (a, p) in zip(node.args.args, head.parameters))
+            lines.append("def {}({}) -> {}: ...".format(node.name, parameters, annotations.Of(head.result) or "None"))
+        elif type(node) == Name and id(node) not in inFunctions:
+            if var.name not in declared:
+                declared[var.name] = []
+                lines.append(var.name)
+            for part in UnionParts(annotations.Of(state)):
+                if part and part not in declared[var.name]:
+                    declared[var.name].append(part)
+    lines = [line if line.startswith("def ") else "{}: {}".format(line, "|".join(declared[line]) or "object") for line in lines]
+
+    prelude = Prelude("\n".join(lines))
+    return ("\n".join(prelude + ([""] if prelude else []) + lines) + "\n").encode()
+
+def UnionParts(annotation: str) -> list[str]:
+    # The members of a union, a "|" within brackets belongs to a member
+    parts = [""]
+    depth = 0
+    for c in annotation:
+        if c == "|" and depth == 0:
+            parts.append("")
+            continue
+        depth += (c == "[") - (c == "]")
+        parts[-1] += c
+    return parts
+
+def Prelude(annotations: str) -> list[str]:
+    # Imports of the names the annotations use and their type variables
+    prelude = ["from types import ModuleType"] if re.search(r"\bModuleType\b", annotations) else []
+    header = [name for name in ("Any", "Callable", "Iterable") if re.search(r"\b{}\b".format(name), annotations)]
+    typeVariables = sorted(set(re.findall(r"\bT_\w+", annotations)))
+    if typeVariables:
+        header.append("TypeVar")
+    if header:
+        prelude.append("from typing import {}".format(", ".join(header)))
+    prelude += ['{} = TypeVar("{}")'.format(t, t) for t in typeVariables]
+    return prelude
+
+def PreludeOffset(source: bytes, tree: Module, offsets: list[int]) -> int:
+    # Start of the line after the docstring and the __future__ imports, which
+    # have to come first, else after the comments the file starts with
+    line = 0
+    for (i, statement) in enumerate(tree.body):
+        docstring = i == 0 and type(statement) == Expr and type(statement.value) == Constant and type(statement.value.value) == str
+        if not docstring and not (type(statement) == ImportFrom and statement.module == "__future__"):
+            break
+        line = statement.end_lineno or statement.lineno
+    if line == 0:
+        while line + 1 < len(offsets) and source[offsets[line]:offsets[line + 1]].lstrip().startswith(b"#"):
+            line += 1
+    return offsets[line]
+
+def OutputPath(filename: str, outputDir: str, kind: str) -> str:
+    relative = os.path.relpath(filename)
+    if relative.startswith(os.pardir):
+        relative = os.path.abspath(filename).lstrip(os.sep)
+    path = os.path.join(outputDir, os.path.splitext(relative)[0] + "." + kind)
+    if os.path.abspath(path) == os.path.abspath(filename):
+        raise ValueError("Annotated output would overwrite {}".format(filename))
+    return path
+
+def WriteOutput(path: str, data: bytes):
+    # One write of the whole file through a buffered binary stream
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+
+def Annotate(source: bytes, tree: Module, variables: list[Variable], kind: str, renderer: Renderer | None = None) -> bytes:
+    # The renderer names the type variables, the one that printed the types
+    # can be passed in to share its work
+    annotations = Annotations(renderer or Renderer([var.state for var in variables]))
+    if kind == "pyi":
+        return Stub(tree, variables, annotations)
+    return AnnotateSource(source, tree, variables, annotations)
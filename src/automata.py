@@ -1,7 +1,18 @@
 from __future__ import annotations
-from copy import deepcopy, copy
+import os
+import time
+from array import array
+from copy import deepcopy
+from typing import TYPE_CHECKING, Iterable, Iterator
+from weakref import ref
+import profiling
+from exceptions import BudgetExceeded
+if TYPE_CHECKING:
+    from schemes import Scheme
 
 class Head:
+    __slots__ = ()
+
     def  __repr__(self) -> str:
         return str(self)
 
@@ -9,6 +20,8 @@ class Head:
         pass
 
 class TypeVariable(Head):
+    __slots__ = ("paramName",)
+
     def __init__(self, paramName: str):
         self.paramName: str = paramName
 
@@ -19,6 +32,8 @@ class TypeVariable(Head):
         assert(False)
 
 class Function(Head):
+    __slots__ = ("parameters", "result")
+
     def __init__(self):
         self.parameters: list[State] = []
         self.result    : State
@@ -40,6 +55,8 @@ class Function(Head):
         return "({}->{})".format(paramString, self.result)
 
 class Record(Head):
+    __slots__ = ("fields",)
+
     def __init__(self):
         self.fields: dict[str, State] = {}
     
@@ -62,6 +79,8 @@ class Record(Head):
         return "rec[{}]".format(",".join(fieldsStrings))
 
 class IterHead(Record):
+    __slots__ = ()
+
     def __init__(self, polarity = True):
         super().__init__()
         self.fields["type"] = State(polarity)
@@ -72,6 +91,8 @@ class IterHead(Record):
         return "{}[{}]".format(self.fields["type"], self.fields["values"])
 
 class DictHead(IterHead):
+    __slots__ = ()
+
     def __init__(self, polarity = True):
         super().__init__(polarity)
         self.fields["type"].heads = {BaseType("dict")}
@@ -93,6 +114,8 @@ class DictHead(IterHead):
         return "{}[{},{}]".format(self.fields["type"], self.fields["keys"], self.fields["values"])
 
 class ListHead(DictHead):
+    __slots__ = ()
+
     def __init__(self, polarity = True):
         super().__init__(polarity)
         self.fields["type"].heads = {BaseType("list")}
@@ -103,6 +126,8 @@ class ListHead(DictHead):
 
 
 class SetHead(IterHead):
+    __slots__ = ()
+
     def __init__(self, polarity = True):
         super().__init__(polarity)
         self.fields["type"].heads = {BaseType("set")}
@@ -114,8 +139,26 @@ class SetHead(IterHead):
         self.fields["pop"] = popState
 
 class BaseType(Head):
-    def __init__(self, name: str):
-        self.name: str = name
+    # Base types are immutable, so there is one shared instance per name
+    __slots__ = ("name",)
+    instances: dict[str, BaseType] = {}
+
+    def __new__(cls, name: str) -> BaseType:
+        instance = BaseType.instances.get(name)
+        if instance is None:
+            instance = super().__new__(cls)
+            instance.name = name
+            BaseType.instances[name] = instance
+        return instance
+
+    def __copy__(self) -> BaseType:
+        return self
+
+    def __deepcopy__(self, memo) -> BaseType:
+        return self
+
+    def __reduce__(self):
+        return (BaseType, (self.name,))
 
     def __str__(self)->str:
         return self.name
@@ -131,7 +174,35 @@ class BaseType(Head):
             return False
         return BaseTypeHierarchy.IsSubtypeOf(self.name, other.name)
 
+class ErrorType(Head):
+    # Type of names bound by statements that failed to check. It is a
+    # subtype of every head, so uses of those names report no new errors.
+    __slots__ = ()
+    instance: ErrorType | None = None
+
+    def __new__(cls) -> ErrorType:
+        if ErrorType.instance is None:
+            ErrorType.instance = super().__new__(cls)
+        return ErrorType.instance
+
+    def __copy__(self) -> ErrorType:
+        return self
+
+    def __deepcopy__(self, memo) -> ErrorType:
+        return self
+
+    def __reduce__(self):
+        return (ErrorType, ())
+
+    def __str__(self) -> str:
+        return "error"
+
+    def IsSubtypeOf(self, other: Head) -> bool:
+        return True
+
 class BaseTypeHierarchy:
+    # Direct supertypes of every base type. Types of other modules, like the
+    # module type of the stubs, are added with Register.
     supertypes: dict[str, set[str]] = {
         "none" : set(),
         "float": set(),
@@ -143,25 +214,138 @@ class BaseTypeHierarchy:
         "list": {"dict"},
         "set" : {"iter"}
     }
+    # Every base type gets one bit, closure holds the bits of all its
+    # supertypes including itself.
+    bits   : dict[str, int] = {}
+    closure: dict[str, int] = {}
+
+    @staticmethod
+    def Register(name: str, supertypes: set[str] = set()):
+        # Adds a base type or new supertypes of an existing one. Types that
+        # already reach name inherit the new supertypes as well.
+        for sup in supertypes:
+            if sup not in BaseTypeHierarchy.bits:
+                raise Exception("Unknown base type: {}".format(sup))
+        if name not in BaseTypeHierarchy.bits:
+            BaseTypeHierarchy.bits[name] = 1 << len(BaseTypeHierarchy.bits)
+            BaseTypeHierarchy.closure[name] = BaseTypeHierarchy.bits[name]
+            BaseTypeHierarchy.supertypes.setdefault(name, set())
+        BaseTypeHierarchy.supertypes[name].update(supertypes)
+        added = 0
+        for sup in supertypes:
+            added |= BaseTypeHierarchy.closure[sup]
+        bit = BaseTypeHierarchy.bits[name]
+        for (sub, mask) in BaseTypeHierarchy.closure.items():
+            if mask & bit:
+                BaseTypeHierarchy.closure[sub] = mask | added
 
     @staticmethod
     def IsSubtypeOf(sub: str, sup: str)->bool:
         if sub == sup:
             return True
-        if sup in BaseTypeHierarchy.supertypes[sub]:
+        return BaseTypeHierarchy.closure[sub] & BaseTypeHierarchy.bits.get(sup, 0) != 0
+
+for name in list(BaseTypeHierarchy.supertypes):
+    BaseTypeHierarchy.Register(name)
+for (name, sups) in list(BaseTypeHierarchy.supertypes.items()):
+    BaseTypeHierarchy.Register(name, sups)
+
+class HeadPartition:
+    # The heads of a state split by kind. Base types are summarized as bit
+    # masks of the hierarchy: the supertypes all of them share and the types
+    # themselves. Heads are only ever added, so the partition of a state
+    # stays valid while its heads have the same size.
+    __slots__ = ("heads", "size", "bases", "meet", "join", "functions", "records", "errors")
+
+    def __init__(self, heads: Iterable[Head], size: int):
+        self.heads    : Iterable[Head] = heads
+        self.size     : int = size
+        self.bases    : int = 0
+        self.meet     : int = -1
+        self.join     : int = 0
+        self.functions: list[Function] = []
+        self.records  : list[Record] = []
+        self.errors   : int = 0
+        bits = BaseTypeHierarchy.bits
+        closure = BaseTypeHierarchy.closure
+        for h in heads:
+            kind = type(h)
+            if kind == BaseType and h.name in bits: #type: ignore
+                self.bases += 1
+                self.meet &= closure[h.name] #type: ignore
+                self.join |= bits[h.name] #type: ignore
+            elif kind == Function:
+                self.functions.append(h) #type: ignore
+            elif isinstance(h, Record):
+                self.records.append(h)
+            elif kind == ErrorType:
+                self.errors += 1
+
+    def IsSubtypeOf(self, other: HeadPartition) -> bool:
+        # Whether every head is a subtype of every head of other. False only
+        # means the heads have to be compared pair by pair.
+        if other.size == 0 or self.size == self.errors:
             return True
-        for parent in BaseTypeHierarchy.supertypes[sub]:
-            if BaseTypeHierarchy.IsSubtypeOf(parent, sup):
-                return True
-        return False
+        if self.bases + len(self.functions) + len(self.records) + self.errors != self.size:
+            return False
+        if self.bases:
+            if other.bases != other.size or self.meet & other.join != other.join:
+                return False
+        if self.functions:
+            if len(other.functions) != other.size:
+                return False
+            arity = len(self.functions[0].parameters)
+            for h in self.functions + other.functions:
+                if len(h.parameters) != arity:
+                    return False
+        if self.records:
+            if len(other.records) != other.size:
+                return False
+            fields = set().union(*(h.fields.keys() for h in other.records))
+            for h in self.records:
+                if not h.fields.keys() >= fields:
+                    return False
+        return True
+
+# The partition of every state without heads
+noHeads = HeadPartition((), 0)
+
+# States created so far, a state's uid is the count after its creation.
+# Reading it has no side effects, budgets and profiles count states with it.
+statesCreated = 0
+# The count at which creating one more state exceeds the state budget
+stateLimit = float("inf")
+
+def StatesCreated() -> int:
+    return statesCreated
+
+def ExceedStates():
+    assert(session.budget)
+    raise BudgetExceeded("state", session.budget.Counters())
 
 class State:
+    __slots__ = ("uid", "polarity", "flows", "heads", "IsParamState", "scheme", "partition")
+
     def __init__(self, polarity : bool):
+        global statesCreated
+        if statesCreated >= stateLimit:
+            ExceedStates()
+        statesCreated += 1
+        self.uid      : int = statesCreated
         self.polarity : bool = polarity
         self.flows    : set[State] = set()
         self.heads    : set[Head]  = set()
         self.IsParamState: bool = False
-    
+        self.scheme   : Scheme | None = None
+        self.partition: HeadPartition | None = None
+
+    def Partition(self) -> HeadPartition:
+        partition = self.partition
+        size = len(self.heads)
+        if partition is None or partition.heads is not self.heads or partition.size != size:
+            partition = self.partition = HeadPartition(self.heads, size) if size else noHeads
+        return partition
+
     def AddFlow(self, other : State):
         assert(self.polarity != other.polarity)
         self.flows.add(other) 
@@ -185,20 +369,461 @@ class State:
 
     def __str__(self) -> str:
         #return "(id:{} p:{} heads{})".format(id(self), self.polarity, self.heads)
-        return "|".join(map(str, self.heads))
+        return "|".join(sorted(map(str, self.heads)))
+
+# Sweeps of the arena wait for at least this many released slots
+SWEEP_MIN = 1024
+
+class GraphArena:
+    # Compact storage of the states: one byte of polarity and an array of the
+    # slots a state flows with, indexed by the slot of the state. States are
+    # found from their slots through weak references, so a state that is only
+    # reachable through flows is released, as PruneFlows would drop those
+    # edges anyway. Released slots are reused after a sweep has removed them
+    # from every flow array.
+    # This only saves memory, about half of the object store, and costs about
+    # twice the time: every access of flows or heads builds a view, and every
+    # flow is resolved through its weak reference. Biunify and Merge go
+    # through both on each pair, see benchmarks/arena.py.
+    __slots__ = ("polarity", "flows", "states", "free", "released")
+
+    def __init__(self):
+        self.polarity: bytearray = bytearray()
+        self.flows   : list[array | None] = []
+        self.states  : list[ref | None] = []
+        self.free    : list[int] = []
+        self.released: list[int] = []
+
+    def Allocate(self, state: ArenaState, polarity: bool) -> int:
+        if not self.free and len(self.released) >= max(SWEEP_MIN, len(self.states) // 4):
+            self.Sweep()
+        if self.free:
+            slot = self.free.pop()
+            self.polarity[slot] = polarity
+            self.states[slot] = ref(state)
+            return slot
+        self.polarity.append(polarity)
+        self.flows.append(None)
+        self.states.append(ref(state))
+        return len(self.states) - 1
+
+    def Release(self, slot: int):
+        self.flows[slot] = None
+        self.states[slot] = None
+        self.released.append(slot)
+
+    def Sweep(self):
+        released = set(self.released)
+        for (slot, flows) in enumerate(self.flows):
+            if flows is not None and not released.isdisjoint(flows):
+                kept = array("i", (f for f in flows if f not in released))
+                self.flows[slot] = kept if kept else None
+        self.free.extend(self.released)
+        self.released.clear()
+
+    def Resolve(self, slots: Iterable[int]) -> list[ArenaState]:
+        states = self.states
+        refs = [states[f] for f in slots]
+        return [q for q in (r() for r in refs if r is not None) if q is not None]
+
+    def Stats(self) -> dict[str, int]:
+        edges = sum(len(f) for f in self.flows if f is not None)
+        return {"slots": len(self.states), "live": len(self.states) - len(self.free) - len(self.released), "edges": edges}
+
+class FlowSet:
+    # Set interface over the flow array of one arena state
+    __slots__ = ("slot",)
+
+    def __init__(self, slot: int):
+        self.slot: int = slot
+
+    def Slots(self) -> array | tuple:
+        flows = ArenaState.arena.flows[self.slot]
+        return flows if flows is not None else ()
+
+    def __iter__(self) -> Iterator[ArenaState]:
+        # Resolved up front, a sweep while iterating may change the array
+        flows = ArenaState.arena.flows[self.slot]
+        return iter(ArenaState.arena.Resolve(flows) if flows is not None else ())
+
+    def __len__(self) -> int:
+        flows = ArenaState.arena.flows[self.slot]
+        return len(flows) if flows is not None else 0
+
+    def __contains__(self, state: ArenaState) -> bool:
+        return state.slot in self.Slots()
+
+    def __or__(self, other: Iterable[ArenaState]) -> set[ArenaState]:
+        return set(self) | set(other)
+
+    def add(self, state: ArenaState):
+        self.update((state,))
+
+    def update(self, states: Iterable[ArenaState]):
+        slots = states.Slots() if type(states) == FlowSet else [q.slot for q in states]
+        if not slots:
+            return
+        arena = ArenaState.arena
+        flows = arena.flows[self.slot]
+        if flows is None:
+            arena.flows[self.slot] = array("i", dict.fromkeys(slots))
+        elif len(flows) * len(slots) <= 64:
+            for f in slots:
+                if f not in flows:
+                    flows.append(f)
+        else:
+            present = set(flows)
+            flows.extend(f for f in dict.fromkeys(slots) if f not in present)
+
+    def difference_update(self, states: Iterable[ArenaState]):
+        arena = ArenaState.arena
+        flows = arena.flows[self.slot]
+        if flows is not None:
+            removed = {q.slot for q in states}
+            kept = array("i", (f for f in flows if f not in removed))
+            arena.flows[self.slot] = kept if kept else None
+
+class HeadSet:
+    # Set interface over the head tuple of one arena state
+    __slots__ = ("state",)
+
+    def __init__(self, state: ArenaState):
+        self.state: ArenaState = state
+
+    def __iter__(self) -> Iterator[Head]:
+        return iter(self.state.headTuple)
+
+    def __len__(self) -> int:
+        return len(self.state.headTuple)
+
+    def __contains__(self, head: Head) -> bool:
+        return head in self.state.headTuple
+
+    def add(self, head: Head):
+        if head not in self.state.headTuple:
+            self.state.headTuple += (head,)
+
+    def update(self, heads: Iterable[Head]):
+        heads = tuple(heads)
+        if heads:
+            self.state.headTuple = tuple(dict.fromkeys(self.state.headTuple + heads))
+
+class ArenaState:
+    # The State interface over a GraphArena. Heads stay with the state as a
+    # tuple, kept in the arena they would keep cyclic types alive.
+    __slots__ = ("uid", "slot", "headTuple", "IsParamState", "scheme", "partition", "__weakref__")
+    arena = GraphArena()
+
+    def __init__(self, polarity : bool):
+        global statesCreated
+        if statesCreated >= stateLimit:
+            ExceedStates()
+        statesCreated += 1
+        self.uid      : int = statesCreated
+        self.slot     : int = ArenaState.arena.Allocate(self, polarity)
+        self.headTuple: tuple[Head, ...] = ()
+        self.IsParamState: bool = False
+        self.scheme   : Scheme | None = None
+        self.partition: HeadPartition | None = None
+
+    def __del__(self):
+        # Not allocated when the state budget stopped its creation
+        if hasattr(self, "slot"):
+            ArenaState.arena.Release(self.slot)
+
+    @property
+    def polarity(self) -> bool:
+        return bool(ArenaState.arena.polarity[self.slot])
+
+    @polarity.setter
+    def polarity(self, polarity: bool):
+        ArenaState.arena.polarity[self.slot] = polarity
+
+    @property
+    def flows(self) -> FlowSet:
+        return FlowSet(self.slot)
+
+    @flows.setter
+    def flows(self, states: Iterable[ArenaState]):
+        slots = array("i", dict.fromkeys(q.slot for q in states))
+        ArenaState.arena.flows[self.slot] = slots if slots else None
+
+    @property
+    def heads(self) -> HeadSet:
+        return HeadSet(self)
+
+    @heads.setter
+    def heads(self, heads: Iterable[Head]):
+        self.headTuple = tuple(dict.fromkeys(heads))
+
+    def Partition(self) -> HeadPartition:
+        partition = self.partition
+        if partition is None or partition.heads is not self.headTuple:
+            partition = self.partition = HeadPartition(self.headTuple, len(self.headTuple)) if self.headTuple else noHeads
+        return partition
+
+    AddFlow = State.AddFlow
+    AddAll = State.AddAll
+    __repr__ = State.__repr__
+    __str__ = State.__str__
+
+    def __deepcopy__(self, memo):
+        copy = ArenaState(self.polarity)
+        memo[id(self)] = copy
+        copy.flows = deepcopy(list(self.flows), memo)
+        copy.heads = deepcopy(self.headTuple, memo)
+        return copy
+
+# TYPHON_STATES=arena stores the graph in a GraphArena instead of objects,
+# for memory at the cost of time
+if os.environ.get("TYPHON_STATES") == "arena":
+    State = ArenaState #type: ignore
+
+# Visits and Biunify calls between two reads of the clock, and Biunify steps
+# between two reads within one Biunify. States and steps are counted exactly.
+BUDGET_TICKS = 64
+BUDGET_INTERVAL = 256
+
+class Budget:
+    # Limits of one inference run, checked by TypeVisitor.visit and Biunify.
+    # States are counted when they are created, which bounds the live states
+    # from above. Steps are the state pairs Biunify unified. The state limit
+    # is checked by every new state and the step limit on every step, only
+    # the time is checked every BUDGET_TICKS or BUDGET_INTERVAL.
+    __slots__ = ("maxSeconds", "maxStates", "maxSteps", "session", "start", "firstState", "ticks")
+
+    def __init__(self, maxSeconds: float | None = None, maxStates: int | None = None, maxSteps: int | None = None):
+        self.maxSeconds: float | None = maxSeconds
+        self.maxStates : int | None = maxStates
+        self.maxSteps  : int | None = maxSteps
+        self.session   : InferenceSession | None = None
+        self.start     : float = time.perf_counter()
+        self.firstState: int = statesCreated
+        # Counts down to the next read of the clock
+        self.ticks     : int = BUDGET_TICKS
+
+    def Start(self):
+        self.start = time.perf_counter()
+        self.firstState = statesCreated
+        self.ticks = BUDGET_TICKS
+
+    def Counters(self, pending: int = 0) -> dict[str, float]:
+        return {
+            "seconds": round(time.perf_counter() - self.start, 3),
+            "states": statesCreated - self.firstState,
+            "steps": (self.session.misses if self.session else 0) + pending
+        }
+
+    def Tick(self):
+        # A visit or Biunify call
+        self.ticks -= 1
+        if self.ticks <= 0:
+            self.Check()
+
+    def Step(self, pending: int = 0):
+        # A Biunify step, pending: steps of the running Biunify that are not
+        # counted yet, including this one
+        steps = (self.session.misses if self.session else 0) + pending
+        if self.maxSteps is not None and steps > self.maxSteps:
+            raise BudgetExceeded("Biunify step", self.Counters(pending))
+        if steps % BUDGET_INTERVAL == 0:
+            self.Check(pending)
+
+    def Check(self, pending: int = 0):
+        # pending: steps of the running Biunify that are not counted yet
+        self.ticks = BUDGET_TICKS
+        if self.maxSeconds is not None and time.perf_counter() - self.start > self.maxSeconds:
+            raise BudgetExceeded("time", self.Counters(pending))
+        if self.maxSteps is not None and self.session and self.session.misses + pending > self.maxSteps:
+            raise BudgetExceeded("Biunify step", self.Counters(pending))
+
+def LimitStates(budget: Budget | None):
+    # Lets new states check the state limit of the running session
+    global stateLimit
+    if budget is None or budget.maxStates is None:
+        stateLimit = float("inf")
+    else:
+        stateLimit = budget.firstState + budget.maxStates
+
+class InferenceSession:
+    # Owns the memo of biunified state pairs for one inference run. Keys are
+    # built from the state uids, so the cache does not keep states alive.
+    __slots__ = ("cache", "maxCacheSize", "budget", "hits", "misses", "evictions", "previous")
+
+    def __init__(self, maxCacheSize: int | None = None, budget: Budget | None = None):
+        # Insertion ordered, the least recently used pair comes first
+        self.cache       : dict[int, None] = {}
+        self.maxCacheSize: int | None = maxCacheSize
+        self.budget      : Budget | None = budget
+        self.hits        : int = 0
+        self.misses      : int = 0
+        self.evictions   : int = 0
+        self.previous    : InferenceSession | None = None
+
+    def __enter__(self) -> InferenceSession:
+        global session
+        self.previous = session
+        session = self
+        if self.budget is not None:
+            # Only linked while running, the session is freed with its file
+            self.budget.session = self
+            self.budget.Start()
+        LimitStates(self.budget)
+        return self
+
+    def __exit__(self, *exc):
+        global session
+        assert(self.previous)
+        session = self.previous
+        self.previous = None
+        if self.budget is not None:
+            self.budget.session = None
+        LimitStates(session.budget)
+
+    def Touch(self, key : int):
+        del self.cache[key]
+        self.cache[key] = None
+
+    def Bound(self):
+        if len(self.cache) > self.maxCacheSize: #type: ignore
+            del self.cache[next(iter(self.cache))]
+            self.evictions += 1
+
+    def Stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.cache),
+            "evictions": self.evictions
+        }
+
+    def __str__(self) -> str:
+        return "hits={hits} misses={misses} size={size} evictions={evictions}".format(**self.Stats())
+
+session : InferenceSession = InferenceSession()
+
+# Pairs of heads up to which Biunify compares heads without partitions
+PAIRWISE_MAX = 4
+
+# Nesting up to which Biunify recurses, deeper pairs go to the worklist
+RECURSION_DEPTH = 256
+
+# Work items of WorklistBiunify: a pair still to unify, or the decomposition
+# of an already unified pair into its result or field pairs.
+UNIFY, RESULTS, FIELDS = 0, 1, 2
 
-cache : set[tuple[State, State]] = set()
 def Biunify(pQ : State, nQ : State):
-    assert(pQ.polarity)
-    assert(not nQ.polarity)
-    if (pQ, nQ) in cache:
+    budget = session.budget
+    if budget is not None:
+        budget.Tick()
+    profiler = profiling.profiler
+    if profiler is None:
+        Unify(pQ, nQ, 0)
         return
-    cache.add((pQ, nQ))
-
+    profiler.Enter("Biunify")
+    try:
+        Unify(pQ, nQ, 0)
+    finally:
+        profiler.Exit()
+
+def SubtypeError(pQ : State, nQ : State) -> Exception:
+    # Heads are compared in set order, the error names the failing pair that
+    # renders first, so it is the same in every run
+    pairs = ((str(p), str(n)) for p in pQ.heads for n in nQ.heads if not p.IsSubtypeOf(n))
+    return Exception("{} is not a subtype of {}".format(*min(pairs)))
+
+def CheckHeads(pQ : State, nQ : State) -> tuple[bool, bool]:
+    # Raises unless every head of pQ is a subtype of every head of nQ. Many
+    # heads are compared by kind, pair by pair only to find the pair that is
+    # not a subtype. Tells whether pQ has function and record heads.
+    if len(pQ.heads) * len(nQ.heads) > PAIRWISE_MAX and pQ.Partition().IsSubtypeOf(nQ.Partition()):
+        return (bool(pQ.Partition().functions), bool(pQ.Partition().records))
+    functions = False
+    records = False
     for pHead in pQ.heads:
         for nHead in nQ.heads:
             if not pHead.IsSubtypeOf(nHead):
-                raise Exception("{} is not a subtype of {}".format(pHead, nHead))
+                raise SubtypeError(pQ, nQ)
+        if type(pHead) == Function:
+            functions = True
+        elif isinstance(pHead, Record):
+            records = True
+    return (functions, records)
+
+def FunctionPairs(pQ : State, nQ : State) -> Iterator[tuple[Function, Function]]:
+    partitioned = len(pQ.heads) * len(nQ.heads) > PAIRWISE_MAX
+    for pHead in pQ.Partition().functions if partitioned else pQ.heads:
+        if type(pHead) == Function:
+            for nHead in nQ.Partition().functions if partitioned else nQ.heads:
+                if type(nHead) == Function:
+                    yield (pHead, nHead) #type: ignore
+
+def ParameterPairs(pQ : State, nQ : State) -> list[tuple[State, State]]:
+    return [(dp, dn) for (pHead, nHead) in FunctionPairs(pQ, nQ) for (dn, dp) in zip(pHead.parameters, nHead.parameters)]
+
+def ResultPairs(pQ : State, nQ : State) -> list[tuple[State, State]]:
+    return [(pHead.result, nHead.result) for (pHead, nHead) in FunctionPairs(pQ, nQ)]
+
+def FieldPairs(pQ : State, nQ : State) -> list[tuple[State, State]]:
+    partitioned = len(pQ.heads) * len(nQ.heads) > PAIRWISE_MAX
+    pairs: list[tuple[State, State]] = []
+    for pHead in pQ.Partition().records if partitioned else pQ.heads:
+        if isinstance(pHead, Record):
+            for nHead in nQ.Partition().records if partitioned else nQ.heads:
+                if isinstance(nHead, Record):
+                    for field in nHead.fields.keys():
+                        pairs.append((pHead.fields[field], nHead.fields[field]))
+    return pairs
+
+def Unify(pQ : State, nQ : State, depth : int):
+    # The parts of a pair are collected before any of them is unified, as
+    # the head sets can grow in the meantime: parameters, then results, then
+    # fields. States with a single head each, which are most of them, need
+    # no copy of the heads as long as they keep that one. Pairs nested
+    # deeper than RECURSION_DEPTH are handed to the worklist, which does not
+    # hit the recursion limit of Python.
+    if depth >= RECURSION_DEPTH:
+        WorklistBiunify(pQ, nQ)
+        return
+    s = session
+    key = (pQ.uid << 40) | nQ.uid
+    if key in s.cache:
+        s.hits += 1
+        if s.maxCacheSize is not None:
+            s.Touch(key)
+        return
+    assert(pQ.polarity)
+    assert(not nQ.polarity)
+    s.misses += 1
+    if s.budget is not None:
+        s.budget.Step()
+    s.cache[key] = None
+    if s.maxCacheSize is not None:
+        s.Bound()
+
+    pHeads = pQ.heads
+    nHeads = nQ.heads
+    if len(pHeads) != 1 or len(nHeads) != 1:
+        (functions, records) = CheckHeads(pQ, nQ)
+        for pQ2 in nQ.flows:
+            Merge(pQ2, pQ) 
+        for nQ2 in pQ.flows:
+            Merge(nQ2, nQ) 
+        depth += 1
+        if functions:
+            for (p, n) in ParameterPairs(pQ, nQ):
+                Unify(p, n, depth)
+            for (p, n) in ResultPairs(pQ, nQ):
+                Unify(p, n, depth)
+        if functions or records:
+            for (p, n) in FieldPairs(pQ, nQ):
+                Unify(p, n, depth)
+        return
+
+    (pHead,) = pHeads
+    (nHead,) = nHeads
+    if pHead is not nHead and not pHead.IsSubtypeOf(nHead):
+        raise Exception("{} is not a subtype of {}".format(pHead, nHead))
 
     for pQ2 in nQ.flows:
         Merge(pQ2, pQ) 
@@ -206,34 +831,98 @@ def Biunify(pQ : State, nQ : State):
     for nQ2 in pQ.flows:
         Merge(nQ2, nQ) 
 
-    # Parameters
-    for pHead in pQ.heads:
-        if type(pHead) == Function:
-            for nHead in nQ.heads:
-                if type(nHead) == Function:
-                    for (dn, dp) in zip(pHead.parameters, nHead.parameters):
-                        Biunify(dp, dn)
-
-    # Result
-    for pHead in pQ.heads:
-        if type(pHead) == Function:
-            for nHead in nQ.heads:
-                if type(nHead) == Function:
-                        Biunify(pHead.result, nHead.result)
-
-    # Fields
-    for pHead in pQ.heads:
-        if isinstance(pHead, Record):
-            for nHead in nQ.heads:
-                if isinstance(nHead, Record):
-                    for key in nHead.fields.keys():
-                        Biunify(pHead.fields[key], nHead.fields[key])
+    depth += 1
+    if type(pHead) == Function:
+        for (dn, dp) in zip(pHead.parameters, nHead.parameters): #type: ignore
+            Unify(dp, dn, depth)
+        if len(pHeads) > 1 or len(nHeads) > 1:
+            for (p, n) in ResultPairs(pQ, nQ):
+                Unify(p, n, depth)
+        else:
+            Unify(pHead.result, nHead.result, depth) #type: ignore
+        if len(pHeads) > 1 or len(nHeads) > 1:
+            for (p, n) in FieldPairs(pQ, nQ):
+                Unify(p, n, depth)
+    elif isinstance(pHead, Record) and isinstance(nHead, Record):
+        fields = pHead.fields
+        for (field, n) in nHead.fields.items():
+            Unify(fields[field], n, depth)
+
+def WorklistBiunify(pQ : State, nQ : State):
+    # Unify without recursion. Items are popped in the order Unify visits
+    # them, each pair fully handled before its next sibling. Results and
+    # fields are collected when they are reached, like Unify does.
+    cache = session.cache
+    bounded = session.maxCacheSize is not None
+    budget = session.budget
+    work: list[tuple[int, State, State, int]] = [(UNIFY, pQ, nQ, (pQ.uid << 40) | nQ.uid)]
+    hits = 0
+    misses = 0
+    try:
+        while work:
+            (kind, pQ, nQ, key) = work.pop()
+            if kind == UNIFY:
+                assert(pQ.polarity)
+                assert(not nQ.polarity)
+                if key in cache:
+                    hits += 1
+                    if bounded:
+                        session.Touch(key)
+                    continue
+                misses += 1
+                if budget is not None:
+                    budget.Step(misses)
+                cache[key] = None
+                if bounded:
+                    session.Bound()
+
+                (functions, records) = CheckHeads(pQ, nQ)
+
+                for pQ2 in nQ.flows:
+                    Merge(pQ2, pQ) 
+
+                for nQ2 in pQ.flows:
+                    Merge(nQ2, nQ) 
+
+                if functions:
+                    work.append((FIELDS, pQ, nQ, 0))
+                    work.append((RESULTS, pQ, nQ, 0))
+                    pairs = ParameterPairs(pQ, nQ)
+                elif records:
+                    pairs = FieldPairs(pQ, nQ)
+                else:
+                    continue
+            elif kind == RESULTS:
+                pairs = ResultPairs(pQ, nQ)
+            else:
+                pairs = FieldPairs(pQ, nQ)
+
+            # Queue the pairs so the first one is handled first. Pairs
+            # unified before are dropped here instead of being queued.
+            for (p, n) in reversed(pairs):
+                key = (p.uid << 40) | n.uid
+                if key in cache:
+                    hits += 1
+                    if bounded:
+                        session.Touch(key)
+                else:
+                    work.append((UNIFY, p, n, key))
+    finally:
+        session.hits += hits
+        session.misses += misses
 
 def Merge(q1: State, q2: State):
     assert(q1.polarity == q2.polarity)
-    q1.flows.update(q2.flows)
-    for h2 in q2.heads:
-            q1.heads.add(copy(h2))
+    profiler = profiling.profiler
+    if profiler is not None:
+        profiler.Enter("Merge")
+    try:
+        q1.flows.update(q2.flows)
+        # Heads are not changed after construction, so they can be shared
+        q1.heads.update(q2.heads)
+    finally:
+        if profiler is not None:
+            profiler.Exit()
 
 def Combine(q1 : State, q2 : State) -> State:
     assert(q1.polarity == q2.polarity)
@@ -0,0 +1,152 @@
+import ast
+import gc
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from annotate import Annotate, OutputPath, WriteOutput
+from automata import Budget, InferenceSession
+from builtIns import BuiltInVariables
+from checker import CheckTree
+from exceptions import BudgetExceeded
+from pretty_printing import FormatTypes, Renderer
+from signature_cache import DEFAULT_MAX_BYTES, SignatureCache
+from type_visitors import TypeVisitor
+
+class FileResult:
+    def __init__(self, filename: str, types: list[str], error: str, seconds: float):
+        self.filename: str = filename
+        self.types   : list[str] = types
+        self.error   : str = error
+        self.seconds : float = seconds
+        self.cacheHits  : int = 0
+        self.cacheMisses: int = 0
+        self.biunify    : dict[str, int] = {}
+        # The limit of the budget a too complex file exceeded, and the
+        # counters when it was stopped
+        self.exceeded   : str | None = None
+        self.counters   : dict[str, float] = {}
+
+    def ToDict(self) -> dict:
+        return {
+            "file": self.filename,
+            "types": self.types,
+            "error": self.error,
+            "seconds": self.seconds,
+            "cacheHits": self.cacheHits,
+            "cacheMisses": self.cacheMisses,
+            "biunify": self.biunify,
+            "tooComplex": dict(limit=self.exceeded, **self.counters) if self.exceeded else None
+        }
+
+    def __str__(self) -> str:
+        status = "too complex" if self.exceeded else "error" if self.error else "ok"
+        return "{:8.3f}s {:5} {}".format(self.seconds, status, self.filename)
+
+def CollectFiles(inputs: list[str]) -> list[str]:
+    files: list[str] = []
+    for entry in inputs:
+        if entry.startswith("@"):
+            with open(entry[1:], 'r') as listFile:
+                files.extend(line.strip() for line in listFile if line.strip())
+        elif os.path.isdir(entry):
+            for root, _, names in sorted(os.walk(entry)):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(".py"))
+        elif glob.has_magic(entry): #type: ignore
+            files.extend(sorted(glob.glob(entry, recursive=True)))
+        else:
+            files.append(entry)
+    return files
+
+# Bound on the Biunify cache of every file, the kind and directory of the
+# annotated output, and the limits of the budget of every file, set per
+# worker
+biunifyCacheSize: int | None = None
+annotateKind: str | None = None
+outputDir: str | None = None
+budgetLimits: tuple[float | None, int | None, int | None] | None = None
+
+def InitWorker(cacheDir: str | None = None, cacheBytes: int = DEFAULT_MAX_BYTES, cacheSize: int | None = None, annotate: str | None = None, output: str | None = None, recover: bool = False, limits: tuple[float | None, int | None, int | None] | None = None):
+    # Builtin templates are compiled on first use and shared by every file
+    # of the process. Compiling them all up front keeps that out of the time
+    # and state budget of whichever file uses one first.
+    BuiltInVariables()
+    global biunifyCacheSize, annotateKind, outputDir, budgetLimits
+    biunifyCacheSize = cacheSize
+    annotateKind = annotate
+    outputDir = output
+    budgetLimits = limits
+    TypeVisitor.recover = recover
+    if cacheDir:
+        TypeVisitor.signatureCache = SignatureCache(cacheDir, cacheBytes)
+
+def CheckFile(filename: str) -> FileResult:
+    start = time.perf_counter()
+    try:
+        with open(filename, 'rb') as file:
+            source = file.read()
+        tree = ast.parse(source, filename)
+    except (OSError, SyntaxError, ValueError) as e:
+        return FileResult(filename, [], str(e), time.perf_counter() - start)
+
+    cache = TypeVisitor.signatureCache
+    (hits, misses) = (cache.hits, cache.misses) if cache else (0, 0)
+    session = InferenceSession(biunifyCacheSize, Budget(*budgetLimits) if budgetLimits else None)
+    try:
+        errorMessage = CheckTree(tree, session=session)
+    except BudgetExceeded as e:
+        result = FileResult(filename, [], str(e), time.perf_counter() - start)
+        result.exceeded = e.limit
+        result.counters = e.counters
+        result.biunify = session.Stats()
+        # The abandoned automaton is cyclic, free it before the next file
+        TypeVisitor.Reset()
+        gc.collect()
+        return result
+    renderer = Renderer([var.state for var in TypeVisitor.typedVariables])
+    types = FormatTypes(TypeVisitor.typedVariables, renderer)
+    if annotateKind and outputDir:
+        try:
+            WriteOutput(OutputPath(filename, outputDir, annotateKind), Annotate(source, tree, TypeVisitor.typedVariables, annotateKind, renderer))
+        except (OSError, ValueError) as e:
+            errorMessage = errorMessage or str(e)
+    result = FileResult(filename, types, errorMessage, time.perf_counter() - start)
+    result.biunify = session.Stats()
+    if cache:
+        result.cacheHits = cache.hits - hits
+        result.cacheMisses = cache.misses - misses
+    return result
+
+def RunBatch(inputs: list[str], workers: int | None = None, cacheDir: str | None = None, cacheBytes: int = DEFAULT_MAX_BYTES, biunifyCacheSize: int | None = None, annotate: str | None = None, output: str | None = None, recover: bool = False, limits: tuple[float | None, int | None, int | None] | None = None) -> list[FileResult]:
+    files = CollectFiles(inputs)
+    initargs = (cacheDir, cacheBytes, biunifyCacheSize, annotate, output, recover, limits)
+    if workers == 1:
+        InitWorker(*initargs)
+        return [CheckFile(f) for f in files]
+
+    chunksize = max(1, len(files) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=InitWorker, initargs=initargs) as executor:
+        return list(executor.map(CheckFile, files, chunksize=chunksize))
+
+def PrintReport(results: list[FileResult], reportPath: str | None = None):
+    for result in results:
+        print(result)
+        if result.error:
+            print("          {}".format(result.error))
+
+    failed = sum(1 for r in results if r.error and not r.exceeded)
+    tooComplex = sum(1 for r in results if r.exceeded)
+    total = sum(r.seconds for r in results)
+    if tooComplex:
+        print("== {} files, {} with errors, {} too complex, {:.3f}s inference time".format(len(results), failed, tooComplex, total))
+    else:
+        print("== {} files, {} with errors, {:.3f}s inference time".format(len(results), failed, total))
+    hits = sum(r.cacheHits for r in results)
+    misses = sum(r.cacheMisses for r in results)
+    if hits or misses:
+        print("== Signature cache: {} hits, {} misses".format(hits, misses))
+
+    if reportPath:
+        with open(reportPath, 'w') as reportFile:
+            json.dump([r.ToDict() for r in results], reportFile, indent=2)
@@ -0,0 +1,83 @@
+import argparse
+import ast
+import gc
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generators import generators
+
+# Checks a large synthetic program with the states stored as objects and in
+# the arena, see GraphArena, and compares time and memory. The store is
+# chosen when automata is imported, so each one runs in its own process.
+
+STORES = {"objects": "", "arena": "arena"}
+
+def Measure(name: str, size: int, repeat: int) -> dict:
+    import automata
+    from checker import CheckTree
+    from type_visitors import TypeVisitor
+    tree = ast.parse(generators[name][0](size))
+    seconds = math.inf
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        CheckTree(tree)
+        seconds = min(seconds, time.perf_counter() - start)
+        gc.enable()
+
+    TypeVisitor.Reset()
+    gc.collect()
+    tracemalloc.start()
+    error = CheckTree(tree)
+    (_, peak) = tracemalloc.get_traced_memory()
+    gc.collect()
+    # The types of the program are still referenced from the visitor
+    (retained, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        "seconds": seconds,
+        "peakKiB": peak / 1024,
+        "retainedKiB": retained / 1024,
+        "variables": len(TypeVisitor.typedVariables),
+        "error": error,
+    }
+    if automata.State is automata.ArenaState:
+        result.update(automata.ArenaState.arena.Stats())
+    return result
+
+def Run(store: str, name: str, size: int, repeat: int) -> dict:
+    env = dict(os.environ, TYPHON_STATES=STORES[store])
+    command = [sys.executable, os.path.abspath(__file__), name, "--size", str(size), "--repeat", str(repeat), "--measure"]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def Main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", nargs="?", default="functions", choices=sorted(generators))
+    parser.add_argument("--size", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per store, the fastest counts")
+    parser.add_argument("--measure", action="store_true", help="measure the store of this process and print JSON")
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(Measure(args.name, args.size, args.repeat)))
+        return
+
+    results = {store: Run(store, args.name, args.size, args.repeat) for store in STORES}
+    (objects, arena) = (results["objects"], results["arena"])
+    print("{} {}  variables {}  error {!r}".format(args.name, args.size, objects["variables"], objects["error"]))
+    if arena["variables"] != objects["variables"] or arena["error"] != objects["error"]:
+        print("stores disagree: arena variables {}  error {!r}".format(arena["variables"], arena["error"]))
+    print("{:<12} {:>10} {:>10} {:>10}".format("", "objects", "arena", "ratio"))
+    for metric in ("seconds", "peakKiB", "retainedKiB"):
+        print("{:<12} {:>10.2f} {:>10.2f} {:>10.2f}".format(metric, objects[metric], arena[metric], arena[metric] / objects[metric]))
+    print("arena slots {slots}  live {live}  flow edges {edges}".format(**arena))
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,45 @@
+import argparse
+import gc
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generators import CallGraph, Functions
+from incremental import Document
+
+# Cost of re-checking a large file after a one-line edit near its start,
+# middle and end, compared to checking it from scratch. Cycles are
+# collected between checks, as the language server does.
+
+def Edit(lines: list[str], at: int) -> tuple[str, int]:
+    while "return" not in lines[at]:
+        at += 1
+    edited = lines[:]
+    edited[at] += " + 0"
+    return ("\n".join(edited), at + 1)
+
+def Main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=5000, help="approximate length of the generated files")
+    args = parser.parse_args()
+    gc.disable()
+
+    for (name, source) in (("functions", Functions(args.lines // 9)), ("call-graph", CallGraph(args.lines * 10 // 31))):
+        lines = source.splitlines()
+        document = Document()
+        start = time.perf_counter()
+        document.Check(source)
+        print("{:<10} {} lines, full check {:.3f}s".format(name, len(lines), time.perf_counter() - start))
+        gc.collect()
+        for at in (5, len(lines) // 2, len(lines) - 30):
+            (edited, line) = Edit(lines, at)
+            start = time.perf_counter()
+            document.Check(edited)
+            seconds = time.perf_counter() - start
+            gc.collect()
+            print("  edit at line {:<5} {:.3f}s  inferred {:<5} reused {}".format(line, seconds, document.rechecked, document.reused))
+            document.Check(source)
+            gc.collect()
+
+if __name__ == "__main__":
+    Main()
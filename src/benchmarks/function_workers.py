@@ -0,0 +1,52 @@
+import argparse
+import ast
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from checker import CheckTree
+from generators import generators
+from parallel import FunctionDependencies, InferFunctions
+from pretty_printing import FormatTypes
+from type_visitors import TypeVisitor
+
+# Wall time of checking a synthetic program sequentially and with its
+# independent top-level functions inferred by worker processes. The check
+# that takes the results of the workers is the part that stays sequential.
+# Fails when a check with workers prints other types or errors.
+
+def Check(tree: ast.Module) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    error = CheckTree(tree)
+    seconds = time.perf_counter() - start
+    return (seconds, FormatTypes(TypeVisitor.typedVariables) + [error])
+
+def Main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", nargs="?", default="functions", choices=sorted(generators))
+    parser.add_argument("--size", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    source = generators[args.name][0](args.size).encode()
+    tree = ast.parse(source)
+    functions = FunctionDependencies(tree)
+    roots = sum(1 for dependencies in functions.values() if not dependencies)
+    print("{} {}  functions {}  independent {}  cores {}".format(args.name, args.size, len(functions), roots, os.cpu_count()))
+    (sequential, expected) = Check(tree)
+    print("sequential      {:8.3f}s".format(sequential))
+    different = 0
+    for workers in args.workers:
+        start = time.perf_counter()
+        TypeVisitor.prefetched = InferFunctions(source, "<{}>".format(args.name), workers)
+        inferred = time.perf_counter() - start
+        (seconds, types) = Check(tree)
+        TypeVisitor.prefetched = {}
+        status = "same" if types == expected else "DIFFERENT"
+        print("workers {:<3}     {:8.3f}s  workers {:.3f}s  check {:.3f}s ({:.0%} of sequential)  {}".format(workers, inferred + seconds, inferred, seconds, seconds / sequential, status))
+        if types != expected:
+            different += 1
+    return 1 if different else 0
+
+if __name__ == "__main__":
+    sys.exit(Main())
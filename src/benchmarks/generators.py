@@ -0,0 +1,90 @@
+# Synthetic programs for the benchmarks, each of a size that grows with n
+
+def StraightLine(n: int) -> str:
+    lines = ["x0 = 1"]
+    for i in range(1, n):
+        lines.append("x{} = x{} + {}".format(i, i - 1, i))
+    return "\n".join(lines) + "\n"
+
+def CallChain(n: int) -> str:
+    return "def id(a):\n    return a\n\nresult = {}12{}\n".format("id(" * n, ")" * n)
+
+def IfTree(n: int) -> str:
+    lines = ["a = 1", "c = 0"]
+    for i in range(n):
+        lines += [
+            "if a > {}:".format(i),
+            "    c = \"s{}\"".format(i),
+            "    c = {}".format(i),
+            "else:",
+            "    c = {}.5".format(i),
+        ]
+    return "\n".join(lines) + "\n"
+
+def Selectors(n: int) -> str:
+    lines = [
+        "def select(cond, val1, val2):",
+        "    if cond:",
+        "        return val1",
+        "    return val2",
+    ]
+    values = ["1", "\"hello\"", "2.5", "True"]
+    for i in range(n):
+        lines.append("r{} = select(True, {}, {})".format(i, values[i % 4], values[(i + 1) % 4]))
+    return "\n".join(lines) + "\n"
+
+def Literals(n: int) -> str:
+    items = ", ".join(str(i) for i in range(n))
+    pairs = ", ".join("\"k{}\": {}.5".format(i, i) for i in range(n))
+    return "xs = [{}]\nd = {{{}}}\nv = xs[0] + d[\"k0\"]\n".format(items, pairs)
+
+def Appends(n: int) -> str:
+    lines = ["xs = [0]", "total = 0"]
+    for i in range(n):
+        lines += [
+            "for v{} in range({}):".format(i, i + 1),
+            "    xs.append(v{} * 2)".format(i),
+            "    total = total + v{}".format(i),
+        ]
+    return "\n".join(lines) + "\n"
+
+def Functions(n: int) -> str:
+    lines = ["total = 0"]
+    for i in range(n):
+        lines += [
+            "def f{}(a, b, c):".format(i),
+            "    x = [a, 1, 2.5]",
+            "    if c:",
+            "        return b",
+            "    return x[0] + {}".format(i),
+            "r{} = f{}(1, 2.0, True)".format(i, i),
+            "s{} = f{}(r{}, {}, False)".format(i, i, i, i),
+            "d{} = {{\"k\": r{}, \"v\": s{}}}".format(i, i, i),
+            "total = total + s{}".format(i),
+        ]
+    return "\n".join(lines) + "\n"
+
+def CallGraph(n: int) -> str:
+    # Every function calls the previous one, with a top-level call every ten
+    lines = ["def f0(a):", "    return a + 1"]
+    for i in range(1, n):
+        lines += [
+            "def f{}(a):".format(i),
+            "    b = [a, {}]".format(i),
+            "    return f{}(b[0])".format(i - 1),
+        ]
+        if i % 10 == 0:
+            lines.append("r{} = f{}(1)".format(i, i))
+    return "\n".join(lines) + "\n"
+
+# Name -> (generator, sizes to run it at)
+generators = {
+    "straight-line": (StraightLine, [250, 500, 1000, 2000]),
+    "call-chain"   : (CallChain,    [25, 50, 100, 200]),
+    "if-tree"      : (IfTree,       [50, 100, 200, 400]),
+    "selectors"    : (Selectors,    [100, 200, 400, 800]),
+    "literals"     : (Literals,     [250, 500, 1000, 2000]),
+    "appends"      : (Appends,      [25, 50, 100, 200]),
+    "functions"    : (Functions,    [25, 50, 100, 200]),
+    "call-graph"   : (CallGraph,    [50, 100, 200, 400]),
+}
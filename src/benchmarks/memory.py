@@ -0,0 +1,30 @@
+import argparse
+import ast
+import os
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generators import Functions
+
+# Peak and retained memory of inferring a large synthetic program
+
+def Main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=300)
+    args = parser.parse_args()
+
+    tree = ast.parse(Functions(args.functions))
+    tracemalloc.start()
+    import builtIns
+    from checker import CheckTree
+    start = time.perf_counter()
+    error = CheckTree(tree)
+    seconds = time.perf_counter() - start
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("functions {}  error {!r}".format(args.functions, error))
+    print("retained {:>8.1f} KiB  peak {:>8.1f} KiB  {:.2f}s".format(current / 1024, peak / 1024, seconds))
+
+if __name__ == "__main__":
+    Main()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from automata import BaseType, Biunify, DictHead, Function, InferenceSession, ListHead, Merge, Record, State
+
+# Time of Biunify on nested ListHead/DictHead types against the recursive
+# engine it replaced, written out below over the same heads and Merge. Every
+# unify gets fresh graphs and an empty memo. Both engines are timed in turns
+# over several rounds and the medians are compared, single rounds vary with
+# the garbage collector and the machine. Below the recursion limit both
+# recurse and take about the same time. The recursive engine fails once the
+# nesting reaches the limit, Biunify hands pairs nested deeper than
+# RECURSION_DEPTH to its worklist.
+
+def RecursiveBiunify(pQ: State, nQ: State, visited: set[tuple[int, int]]):
+    if (pQ.uid, nQ.uid) in visited:
+        return
+    visited.add((pQ.uid, nQ.uid))
+    for pHead in pQ.heads:
+        for nHead in nQ.heads:
+            if not pHead.IsSubtypeOf(nHead):
+                raise Exception("{} is not a subtype of {}".format(pHead, nHead))
+    for pQ2 in nQ.flows:
+        Merge(pQ2, pQ)
+    for nQ2 in pQ.flows:
+        Merge(nQ2, nQ)
+    for pHead in pQ.heads:
+        if type(pHead) == Function:
+            for nHead in nQ.heads:
+                if type(nHead) == Function:
+                    for (dn, dp) in zip(pHead.parameters, nHead.parameters): #type: ignore
+                        RecursiveBiunify(dp, dn, visited)
+    for pHead in pQ.heads:
+        if type(pHead) == Function:
+            for nHead in nQ.heads:
+                if type(nHead) == Function:
+                    RecursiveBiunify(pHead.result, nHead.result, visited) #type: ignore
+    for pHead in pQ.heads:
+        if isinstance(pHead, Record):
+            for nHead in nQ.heads:
+                if isinstance(nHead, Record):
+                    for key in nHead.fields.keys():
+                        RecursiveBiunify(pHead.fields[key], nHead.fields[key], visited)
+
+def Nested(kind: type, depth: int, polarity: bool, leaf: str) -> State:
+    # kind[kind[...kind[leaf]]], the negative side with a flow at every level
+    # like the parameters and subscripts of a checked program
+    state = State(polarity)
+    state.heads.add(BaseType(leaf))
+    for _ in range(depth):
+        outer = State(polarity)
+        head = kind(polarity)
+        head.fields["values"].heads.update(state.heads)
+        head.fields["values"].flows.update(state.flows)
+        if not polarity:
+            variable = State(True)
+            variable.AddFlow(head.fields["values"])
+        outer.heads.add(head)
+        state = outer
+    return state
+
+def Pairs(kind: type, depth: int, count: int) -> list[tuple[State, State]]:
+    return [(Nested(kind, depth, True, "int"), Nested(kind, depth, False, "float")) for _ in range(count)]
+
+def TimeRecursive(kind: type, depth: int, count: int) -> float | None:
+    pairs = Pairs(kind, depth, count)
+    start = time.perf_counter()
+    try:
+        for (p, n) in pairs:
+            RecursiveBiunify(p, n, set())
+    except RecursionError:
+        return None
+    return (time.perf_counter() - start) / count
+
+def TimeBiunify(kind: type, depth: int, count: int) -> tuple[float, int]:
+    pairs = Pairs(kind, depth, count)
+    start = time.perf_counter()
+    steps = 0
+    for (p, n) in pairs:
+        with InferenceSession() as session:
+            Biunify(p, n)
+            steps += session.misses
+    return ((time.perf_counter() - start) / count, steps // count)
+
+def Measure(kind: type, depth: int, count: int, rounds: int) -> tuple[float | None, float, int]:
+    # Median time per unify of both engines
+    recursive: list[float] = []
+    biunify: list[float] = []
+    steps = 0
+    for _ in range(rounds):
+        seconds = TimeRecursive(kind, depth, count)
+        if seconds is not None:
+            recursive.append(seconds)
+        (seconds, steps) = TimeBiunify(kind, depth, count)
+        biunify.append(seconds)
+    return (statistics.median(recursive) if recursive else None, statistics.median(biunify), steps)
+
+def Main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 50, 200, 2000])
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=9)
+    args = parser.parse_args()
+    for kind in (ListHead, DictHead):
+        for depth in args.depths:
+            (recursive, biunify, steps) = Measure(kind, depth, args.count, args.rounds)
+            if recursive is None:
+                print("{:<9} depth {:<4} steps {:<6} recursive    RecursionError  Biunify {:8.1f} us".format(kind.__name__, depth, steps, biunify * 1e6))
+                continue
+            print("{:<9} depth {:<4} steps {:<6} recursive {:8.1f} us  Biunify {:8.1f} us  speedup {:.2f}x".format(
+                kind.__name__, depth, steps, recursive * 1e6, biunify * 1e6, recursive / biunify))
+
+if __name__ == "__main__":
+    Main()
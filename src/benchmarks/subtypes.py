@@ -0,0 +1,80 @@
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from automata import BaseType, BaseTypeHierarchy, Function, HeadPartition, IterHead, ListHead, State
+
+# Micro benchmark of base type subtype checks: the recursive walk over the
+# direct supertypes that was used before against the bitmask closure. Then
+# the heads of two states with wide unions compared pair by pair against
+# their partitions by kind, see HeadPartition.
+
+def WalkIsSubtypeOf(sub: str, sup: str) -> bool:
+    if sub == sup:
+        return True
+    if sup in BaseTypeHierarchy.supertypes[sub]:
+        return True
+    for parent in BaseTypeHierarchy.supertypes[sub]:
+        if WalkIsSubtypeOf(parent, sup):
+            return True
+    return False
+
+def Main():
+    names = list(BaseTypeHierarchy.supertypes)
+    pairs = [(sub, sup) for sub in names for sup in names]
+    for (sub, sup) in pairs:
+        assert WalkIsSubtypeOf(sub, sup) == BaseTypeHierarchy.IsSubtypeOf(sub, sup)
+    heads = [(BaseType(sub), BaseType(sup)) for (sub, sup) in pairs]
+
+    def Walk():
+        for (sub, sup) in pairs:
+            WalkIsSubtypeOf(sub, sup)
+
+    def Closure():
+        for (sub, sup) in pairs:
+            BaseTypeHierarchy.IsSubtypeOf(sub, sup)
+
+    def Heads():
+        for (pHead, nHead) in heads:
+            pHead.IsSubtypeOf(nHead)
+
+    for (name, function) in (("walk", Walk), ("closure", Closure), ("heads", Heads)):
+        seconds = min(timeit.repeat(function, number=2000, repeat=5))
+        print("{:<8} {:>7.1f} ns/check".format(name, seconds / (2000 * len(pairs)) * 1e9))
+
+    for width in (4, 16, 64):
+        Unions(width)
+
+def Union(polarity: bool, heads: list) -> State:
+    state = State(polarity)
+    state.heads.update(heads)
+    return state
+
+def FunctionHead(arity: int) -> Function:
+    head = Function()
+    head.parameters = [State(False) for _ in range(arity)]
+    head.result = State(True)
+    return head
+
+def Unions(width: int):
+    # There are only so many base types
+    bases = [BaseType(name) for name in list(BaseTypeHierarchy.bits)[:width]]
+    states = [
+        ("bases", Union(True, bases), Union(False, bases)),
+        ("functions", Union(True, [FunctionHead(2) for _ in range(width)]), Union(False, [FunctionHead(2) for _ in range(width)])),
+        ("records", Union(True, [ListHead(True) for _ in range(width)]), Union(False, [IterHead(False) for _ in range(width)])),
+    ]
+    for (name, pQ, nQ) in states:
+        def Pairwise():
+            for pHead in pQ.heads:
+                for nHead in nQ.heads:
+                    pHead.IsSubtypeOf(nHead)
+
+        def Partitions():
+            HeadPartition(pQ.heads, len(pQ.heads)).IsSubtypeOf(HeadPartition(nQ.heads, len(nQ.heads)))
+
+        times = [min(timeit.repeat(function, number=200, repeat=5)) / 200 * 1e6 for function in (Pairwise, Partitions)]
+        print("{:<9} {:>2}x{:<2}  pairwise {:>7.2f} us  partitions {:>7.2f} us".format(name, len(pQ.heads), len(nQ.heads), *times))
+
+if __name__ == "__main__":
+    Main()
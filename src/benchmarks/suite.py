@@ -0,0 +1,140 @@
+import argparse
+import ast
+import gc
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from automata import InferenceSession, State, StatesCreated
+from checker import CheckTree
+from generators import generators
+from serialization import EncodeStates
+from type_visitors import TypeVisitor
+
+# Runs every generator at growing sizes and compares how the metrics scale
+# with the stored baselines. A metric whose log-log slope over the sizes
+# grows past the baseline slope is reported as a regression.
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+# Slope above which a metric is reported as superlinear
+SUPERLINEAR = 1.25
+METRICS = ["seconds", "peakKiB", "unify", "states", "live"]
+# Metrics that do not depend on the machine, their values are compared too
+EXACT = ["unify", "states", "live"]
+# Wall time is noisy, its slope gets more room than the other metrics
+NOISY = ["seconds"]
+
+def Measure(source: str, repeat: int) -> dict:
+    tree = ast.parse(source)
+    seconds = math.inf
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        start = time.perf_counter()
+        CheckTree(tree)
+        seconds = min(seconds, time.perf_counter() - start)
+        gc.enable()
+
+    session = InferenceSession()
+    firstState = StatesCreated()
+    tracemalloc.start()
+    error = CheckTree(tree, session=session)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    states = StatesCreated() - firstState
+    roots = [var.state for var in TypeVisitor.typedVariables]
+    live = len(EncodeStates(roots, structural=True)[0])
+    return {
+        "seconds": seconds,
+        "peakKiB": peak / 1024,
+        "unify": session.hits + session.misses,
+        "states": states,
+        "live": live,
+        "error": error,
+    }
+
+def Slope(sizes: list[int], values: list[float]) -> float:
+    # Least squares fit of log(value) against log(size)
+    points = [(math.log(n), math.log(v)) for (n, v) in zip(sizes, values) if v > 0]
+    if len(points) < 2:
+        return 0.0
+    meanX = sum(x for (x, _) in points) / len(points)
+    meanY = sum(y for (_, y) in points) / len(points)
+    numerator = sum((x - meanX) * (y - meanY) for (x, y) in points)
+    denominator = sum((x - meanX) ** 2 for (x, _) in points)
+    return numerator / denominator
+
+def RunGenerator(name: str, repeat: int) -> dict:
+    (generator, sizes) = generators[name]
+    runs = [Measure(generator(n), repeat) for n in sizes]
+    for (n, run) in zip(sizes, runs):
+        print("{:<14} n={:<6} {:>8.3f}s {:>9.1f}KiB unify {:>8} states {:>8} live {:>7} {}".format(
+            name, n, run["seconds"], run["peakKiB"], run["unify"], run["states"], run["live"], run["error"]))
+    slopes = {m: Slope(sizes, [run[m] for run in runs]) for m in METRICS}
+    return {"sizes": sizes, "runs": runs, "slopes": slopes}
+
+def Compare(name: str, result: dict, baseline: dict | None, tolerance: float, timeTolerance: float) -> list[str]:
+    problems = []
+    for m in METRICS:
+        slope = result["slopes"][m]
+        if slope > SUPERLINEAR:
+            print("{:<14} {:<8} scales superlinearly, slope {:.2f}".format(name, m, slope))
+        if baseline is None or baseline["sizes"] != result["sizes"]:
+            continue
+        if slope > baseline["slopes"][m] + (timeTolerance if m in NOISY else tolerance) and slope > SUPERLINEAR:
+            problems.append("{} {}: slope {:.2f}, baseline {:.2f}".format(name, m, slope, baseline["slopes"][m]))
+        if m in EXACT:
+            value = result["runs"][-1][m]
+            expected = baseline["runs"][-1][m]
+            if value > expected * (1 + tolerance):
+                problems.append("{} {}: {} at n={}, baseline {}".format(name, m, value, result["sizes"][-1], expected))
+    for run in result["runs"]:
+        if run["error"]:
+            problems.append("{}: {}".format(name, run["error"]))
+            break
+    return problems
+
+def Main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="generators to run, all by default")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per size, the fastest counts")
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed growth of slopes and counts")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed growth of the wall time slope")
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in generators:
+            parser.error("unknown generator {}, choose from {}".format(name, ", ".join(generators)))
+    names = args.names or list(generators)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    problems = []
+    results = {}
+    for name in names:
+        results[name] = RunGenerator(name, args.repeat)
+        problems += Compare(name, results[name], baselines.get(name), args.tolerance, args.time_tolerance)
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=1)
+        print("== Baselines written to {}".format(args.baselines))
+    elif problems:
+        print("== Regressions:")
+        for problem in problems:
+            print("   " + problem)
+        sys.exit(1)
+    else:
+        print("== No regressions")
+
+if __name__ == "__main__":
+    Main()
@@ -1,6 +1,9 @@
+from __future__ import annotations
 from scope import Scope, Variable
-from automata import DictHead, Head, IterHead, ListHead, SetHead, State, Function, BaseType, BaseType
+from automata import DictHead, Head, IterHead, ListHead, SetHead, State, Function, BaseType
+from schemes import Scheme
 from ast import stmt
+from typing import Callable
 
 def F(args : list[State] = [], argLink : list[int] = [], returnHeads : set[Head] = set())->State:
     functionState: State = State(True)
@@ -15,7 +18,7 @@ def F(args : list[State] = [], argLink : list[int] = [], returnHeads : set[Head]
         args[i].AddFlow(functionHead.result)
     return functionState
 
-def S(heads: set[BaseType] = set())->State:
+def S(heads: set[Head] = set())->State:
     state: State = State(True)
     state.heads.update(heads)
     return state
@@ -23,56 +26,87 @@ def S(heads: set[BaseType] = set())->State:
 def H(typeName: str)->BaseType:
     return BaseType(typeName)
 
+### Built in functions and variables: ###
+# Signatures are written as "parameters -> result". A type is a base type,
+# one of the containers below, or "any" for a parameter without heads.
+builtInTable : dict[str, str] = {
+    "print"  : "any -> none",
+    "input"  : "str -> str",
+    "+"      : "float, float -> float",
+    "-"      : "float, float -> float",
+    "*"      : "float, float -> float",
+    "/"      : "float, float -> float",
+    "%"      : "float, float -> float",
+    "**"     : "float, float -> float",
+    "//"     : "float, float -> int",
+    "not"    : "bool -> bool",
+    "and"    : "bool, bool -> bool",
+    "or"     : "bool, bool -> bool",
+    "=="     : "any, any -> bool",
+    "!="     : "any, any -> bool",
+    "<"      : "float, float -> bool",
+    "<="     : "float, float -> bool",
+    ">"      : "float, float -> bool",
+    ">="     : "float, float -> bool",
+    "int"    : "any -> int",
+    "str"    : "any -> str",
+    "float"  : "any -> float",
+    "list"   : "-> list",
+    "dict"   : "-> dict",
+    "set"    : "-> set",
+    "bool"   : "any -> bool",
+    "chr"    : "int -> str",
+    "ord"    : "str -> int",
+    "randint": "int, int -> int",
+    "len"    : "iter -> int",
+}
+
+# Containers take the polarity of the state they are in: negative in
+# parameters, positive in results and values
+containers : dict[str, Callable[[bool], Head]] = {
+    "list": ListHead,
+    "dict": DictHead,
+    "set" : SetHead,
+    "iter": IterHead,
+}
+
+def Heads(typeName : str, polarity : bool = True) -> set[Head]:
+    if typeName == "any":
+        return set()
+    if typeName in containers:
+        return {containers[typeName](polarity)}
+    return {H(typeName)}
+
+def CompileSignature(signature : str) -> State:
+    # A signature without "->" is the type of a value
+    if "->" not in signature:
+        return S(Heads(signature.strip()))
+    (parameters, result) = signature.split("->")
+    args = [S(Heads(t.strip(), False)) for t in parameters.split(",") if t.strip()]
+    return F(args, [], Heads(result.strip()))
+
+def Compile(name : str) -> State:
+    return CompileSignature(builtInTable[name])
+
 dummyNode = stmt()
 dummyNode.lineno = 0
 dummyNode.col_offset = 0
-builtInsScope: Scope = Scope()
-def BuiltIn(name : str, state: State):
-    builtInsScope.Add(name, Variable(name, dummyNode, state))
-
-### Built in functions and variables: ###
-BuiltIn("print", F([S()], [], {H("none")}))
-BuiltIn("input", F([S({H("str")})], [], {H("str")}))
-BuiltIn("+", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("-", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("*", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("/", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("%", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("**", F([S({H("float")}), S({H("float")})], [], {H("float")}))
-BuiltIn("//", F([S({H("float")}), S({H("float")})], [], {H("int")}))
-BuiltIn("not", F([S({H("bool")})], [], {H("bool")}))
-BuiltIn("and", F([S({H("bool")}), S({H("bool")})], [], {H("bool")}))
-BuiltIn("or", F([S({H("bool")}), S({H("bool")})], [], {H("bool")}))
-s = S()
-BuiltIn("==", F([S(), S()], [], {H("bool")}))
-s = S()
-BuiltIn("!=", F([S(), S()], [], {H("bool")}))
-BuiltIn("<", F([S({H("float")}), S({H("float")})], [], {H("bool")}))
-BuiltIn("<=", F([S({H("float")}), S({H("float")})], [], {H("bool")}))
-BuiltIn(">", F([S({H("float")}), S({H("float")})], [], {H("bool")}))
-BuiltIn(">=", F([S({H("float")}), S({H("float")})], [], {H("bool")}))
-s = S()
-BuiltIn("int", F([s], [], {H("int")}))
-s = S()
-BuiltIn("str", F([s], [], {H("str")}))
-s = S()
-BuiltIn("float", F([s], [], {H("float")}))
-h = ListHead(True)
-BuiltIn("list", F([], [], {h}))
-h = DictHead(False)
-BuiltIn("dict", F([], [], {h}))
-h = SetHead(False)
-BuiltIn("set", F([], [], {h}))
-s = S()
-BuiltIn("bool", F([s], [], {H("bool")}))
-BuiltIn("chr", F([S({H("int")})], [], {H("str")}))
-BuiltIn("ord", F([S({H("string")})], [], {H("int")}))
-BuiltIn("randint", F([S({H("int")}), S({H("int")})], [], {H("int")}))
-
-s = S()
-h = IterHead(False)
-s.heads.add(h)
-BuiltIn("len", F([s], [], {H("int")}))
 
+class BuiltInBindings(dict):
+    # Builtins are compiled into templates on first lookup. A template is never
+    # handed out for unification, every use site instantiates its scheme, so
+    # the templates can be shared by every file checked in this process.
+    def get(self, name, default = None):
+        variable = dict.get(self, name)
+        if variable is None and name in builtInTable:
+            state = Compile(name)
+            state.scheme = Scheme(state)
+            variable = Variable(name, dummyNode, state)
+            self[name] = variable
+        return variable if variable is not None else default
 
+builtInsScope: Scope = Scope()
+builtInsScope.bindings = BuiltInBindings()
 
+def BuiltInVariables() -> list[Variable]:
+    return [builtInsScope.Get(name) for name in builtInTable]
@@ -0,0 +1,55 @@
+from ast import AST, Module
+from typing import Callable
+from automata import InferenceSession, State, StatesCreated
+from builtIns import builtInsScope
+from simplification import PruneFlows
+from type_visitors import TypeVisitor
+
+# Minimal number of new states between two simplifications of the live graph
+PRUNE_INTERVAL = 2000
+
+def CheckTree(tree: AST, debug: bool = False, session: InferenceSession | None = None, onStatement: Callable[[TypeVisitor, AST], None] | None = None) -> str:
+    # Type inference keeps state on TypeVisitor and in the Biunify cache of
+    # the session, both have to start clean for every checked file.
+    TypeVisitor.Reset()
+
+    errorMessage = ""
+    visitor = TypeVisitor(builtInsScope)
+    session = session or InferenceSession()
+    # BudgetExceeded is no Exception, it aborts the check of the file
+    TypeVisitor.budget = session.budget
+    try:
+        with session:
+            if not debug:
+                try:
+                    InferStatements(visitor, tree, onStatement)
+                except Exception as e:
+                    errorMessage = str(e)
+            else:
+                InferStatements(visitor, tree, onStatement)
+    finally:
+        TypeVisitor.budget = None
+    if TypeVisitor.errors:
+        errorMessage = "\n".join(str(e) for e in TypeVisitor.errors)
+    return errorMessage
+
+def InferStatements(visitor: TypeVisitor, tree: AST, onStatement: Callable[[TypeVisitor, AST], None] | None = None):
+    if type(tree) != Module:
+        visitor.InferTypes(tree)
+        return
+
+    # The live graph is simplified at statement boundaries. Waiting until it
+    # has grown by its own size keeps the total cost linear.
+    nextPrune = StatesCreated() + PRUNE_INTERVAL
+    for statement in tree.body: #type: ignore
+        visitor.VisitStatement(statement)
+        if onStatement:
+            onStatement(visitor, statement)
+        if StatesCreated() >= nextPrune:
+            stats = PruneFlows(LiveRoots(visitor))
+            nextPrune = StatesCreated() + max(PRUNE_INTERVAL, stats.statesAfter)
+
+def LiveRoots(visitor: TypeVisitor) -> list[State]:
+    roots = [var.state for var in TypeVisitor.typedVariables]
+    roots.extend(var.state for (_, var) in visitor.scope.mapping)
+    return roots
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from hashlib import blake2b
+from automata import Function, Record, State
+from scope import Scope, Variable
+
+class DependencyLog:
+    # Loads of top-level bindings while one top-level statement is inferred.
+    # A binding that is only called is instantiated from its scheme, so the
+    # statement neither reads nor changes the live states of that binding
+    # and only depends on the scheme. With reads, the shapes of the values
+    # loaded are kept as well, see Dependencies.
+    def __init__(self, scope : Scope, reads : bool = False):
+        self.scope    : Scope = scope
+        self.names    : dict[str, Variable] = {}
+        self.loads    : dict[int, int] = {}
+        self.calls    : dict[int, int] = {}
+        # Shape of every value at its first load
+        self.reads    : dict[str, str | None] | None = {} if reads else None
+        # Cleared when results were reused without visiting the body
+        self.complete : bool = True
+
+    def Load(self, name : str, variable : Variable):
+        if self.scope.bindings.get(name) is not variable:
+            return
+        self.names[name] = variable
+        self.loads[id(variable.state)] = self.loads.get(id(variable.state), 0) + 1
+
+    def Read(self, name : str, variable : Variable):
+        # A load of a binding as a value
+        if self.reads is None or name in self.reads or self.scope.bindings.get(name) is not variable:
+            return
+        self.reads[name] = Shape(variable.state)
+
+    def Call(self, state : State):
+        self.calls[id(state)] = self.calls.get(id(state), 0) + 1
+
+    def Values(self) -> list[str]:
+        # Names of the bindings that were used other than by calling them
+        return [name for (name, variable) in self.names.items() if self.calls.get(id(variable.state), 0) < self.loads[id(variable.state)]]
+
+    def Dependencies(self, results : list[State]) -> tuple[list[tuple[str, str]], list[tuple[str, str]]] | None:
+        # (name, signature of its scheme) of every top-level binding the
+        # statement only called, and (name, shape) of every one it used as a
+        # value. None when the statement can have changed a value, or its
+        # results share states or heads with one, as a replay would not.
+        # Biunify only changes a value through its flows, which values with
+        # a shape do not have, and append, add and update through the heads
+        # they share with their result.
+        if not self.complete:
+            return None
+        dependencies = []
+        values = []
+        reached : set[int] | None = None
+        for (name, variable) in self.names.items():
+            if self.calls.get(id(variable.state), 0) < self.loads[id(variable.state)]:
+                shape = self.reads.get(name) if self.reads is not None else None
+                if shape is None or Shape(variable.state) != shape:
+                    return None
+                if reached is None:
+                    reached = Reachable(results)
+                if not reached.isdisjoint(Reachable([variable.state])):
+                    return None
+                values.append((name, shape))
+                continue
+            scheme = variable.state.scheme
+            if scheme is None or scheme.signature is None:
+                return None
+            dependencies.append((name, scheme.signature))
+        return (sorted(dependencies), sorted(values))
+
+def Reachable(roots : list[State]) -> set[int]:
+    # Ids of the states and mutable heads reachable from roots
+    seen : set[int] = set()
+    work = list(roots)
+    while work:
+        state = work.pop()
+        if id(state) in seen:
+            continue
+        seen.add(id(state))
+        work.extend(state.flows)
+        for head in state.heads:
+            if type(head) == Function:
+                seen.add(id(head))
+                work.extend(head.parameters) #type: ignore
+                work.append(head.result) #type: ignore
+            elif isinstance(head, Record):
+                seen.add(id(head))
+                work.extend(head.fields.values())
+    return seen
+
+def Shape(state : State) -> str | None:
+    # The type of a value without flows and cycles as a string that does
+    # not depend on the order of the heads, None for other values
+    shapes : dict[int, str | None] = {}
+    try:
+        return ShapeOf(state, shapes)
+    except RecursionError:
+        return None
+
+def ShapeOf(state : State, shapes : dict[int, str | None]) -> str | None:
+    key = id(state)
+    if key in shapes:
+        # None while the state is being shaped, so cycles give None
+        return shapes[key]
+    shapes[key] = None
+    if state.flows:
+        return None
+    parts : list[str] = []
+    for head in state.heads:
+        if type(head) == Function:
+            children = [ShapeOf(p, shapes) for p in head.parameters] + [ShapeOf(head.result, shapes)] #type: ignore
+            if None in children:
+                return None
+            parts.append("({}->{})".format(",".join(children[:-1]), children[-1])) #type: ignore
+        elif isinstance(head, Record):
+            fields = [(field, ShapeOf(value, shapes)) for (field, value) in sorted(head.fields.items())]
+            if any(shape is None for (_, shape) in fields):
+                return None
+            parts.append("{}[{}]".format(type(head).__name__, ",".join("{}:{}".format(field, shape) for (field, shape) in fields)))
+        else:
+            parts.append(str(head))
+    shape = "{}{{{}}}".format("+" if state.polarity else "-", "|".join(sorted(parts)))
+    shapes[key] = shape
+    return shape
+
+def Signature(source : str, dependencies : list[tuple[str, str]]) -> str:
+    digest = blake2b(source.encode(), digest_size=16)
+    for (name, signature) in dependencies:
+        digest.update("\0{}={}".format(name, signature).encode())
+    return digest.hexdigest()
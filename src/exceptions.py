@@ -17,4 +17,15 @@ class TypeError(ToolError):
 
 class NotSupported(ToolError):
     def __init__(self, node: expr | stmt | arg, what: str):
-        super().__init__(node, "Error no support {}".format(what))
\ No newline at end of file
+        super().__init__(node, "Error no support {}".format(what))
+
+
+class BudgetExceeded(BaseException):
+    # Not an Exception, so neither recovery nor the handlers that report
+    # failures as type errors catch it: the check of the file is abandoned
+    def __init__(self, limit : str, counters : dict[str, float]):
+        self.limit = limit
+        self.counters = counters
+
+    def __str__(self) -> str:
+        return "Too complex: {} budget exceeded ({})".format(self.limit, ", ".join("{}={}".format(k, v) for (k, v) in self.counters.items()))
@@ -0,0 +1,96 @@
+from __future__ import annotations
+import ast
+from ast import AugAssign, Name, stmt
+from automata import BaseType, Function, Record, State
+from exceptions import ToolError
+from scope import Variable
+
+# Loop bodies are inferred until the bindings carried around the back edge
+# and the outer states the body reads stop gaining types. Passes after the
+# first only visit the statements that read a binding or outer state that
+# changed, the others replay their results. The test of a while loop is
+# checked again by every pass.
+
+# Passes over one loop body at most
+MAX_PASSES = 5
+
+class LoopStats:
+    __slots__ = ("loops", "passes", "visited", "replayed", "capped")
+
+    def __init__(self):
+        self.loops   : int = 0
+        self.passes  : int = 0
+        self.visited : int = 0
+        self.replayed: int = 0
+        # Loops that still changed after MAX_PASSES
+        self.capped  : int = 0
+
+    def __str__(self) -> str:
+        return "loops={} passes={} visited={} replayed={} capped={}".format(self.loops, self.passes, self.visited, self.replayed, self.capped)
+
+def LoopFingerprint(state: State, firstUid: int, memo: dict[int, frozenset] | None = None, path: set[int] | None = None) -> frozenset:
+    # Labels of the heads, of every field below them, and the flows into
+    # states that existed before the loop. States made by an earlier pass
+    # are new in every pass, flows into them are not labelled. A state that
+    # is already on the path is a recursive type and adds no labels.
+    if memo is None or path is None:
+        (memo, path) = ({}, set())
+    labels = memo.get(state.uid)
+    if labels is not None:
+        return labels
+    if state.uid in path:
+        return frozenset()
+    path.add(state.uid)
+    found: set = {f.uid for f in state.flows if f.uid < firstUid}
+    for h in state.heads:
+        if type(h) == BaseType:
+            found.add(h.name) #type: ignore
+        elif type(h) == Function:
+            found.add(("->", len(h.parameters))) #type: ignore
+            found.update(("->", label) for label in LoopFingerprint(h.result, firstUid, memo, path)) #type: ignore
+        elif isinstance(h, Record):
+            found.add((type(h).__name__, tuple(h.fields)))
+            for (key, value) in h.fields.items():
+                found.update((key, label) for label in LoopFingerprint(value, firstUid, memo, path))
+        else:
+            found.add(type(h).__name__)
+    path.discard(state.uid)
+    labels = frozenset(found)
+    memo[state.uid] = labels
+    return labels
+
+def OuterFingerprint(state: State, firstUid: int) -> frozenset:
+    # Labels of a state from before the loop that the body reads, with those
+    # of the states from before the loop it flows with. A pass changes them
+    # when the body merges into them, like into the parameters of the
+    # enclosing function.
+    memo: dict[int, frozenset] = {}
+    found = set(LoopFingerprint(state, firstUid, memo, set()))
+    for f in state.flows:
+        if f.uid < firstUid:
+            found.update(("~", label) for label in LoopFingerprint(f, firstUid, memo, set()))
+    return frozenset(found)
+
+def Reads(statement: stmt) -> set[str]:
+    names = {n.id for n in ast.walk(statement) if type(n) == Name and type(n.ctx) == ast.Load}
+    names.update(n.target.id for n in ast.walk(statement) if type(n) == AugAssign and type(n.target) == Name) #type: ignore
+    return names
+
+class StatementRecord:
+    # What inferring a statement added: bindings of the visitor, typed
+    # variables and recovered errors, and whether it returned
+    __slots__ = ("statement", "reads", "bindings", "variables", "errors", "returned")
+
+    def __init__(self, statement: stmt, bindings: list[tuple[str, Variable]], variables: list[Variable], errors: list[ToolError], returned: bool):
+        self.statement: stmt = statement
+        self.reads    : set[str] | None = None
+        self.bindings : list[tuple[str, Variable]] = bindings
+        self.variables: list[Variable] = variables
+        self.errors   : list[ToolError] = errors
+        self.returned : bool = returned
+
+    def Reads(self) -> set[str]:
+        # Only needed once a second pass runs
+        if self.reads is None:
+            self.reads = Reads(self.statement)
+        return self.reads
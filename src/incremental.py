@@ -0,0 +1,239 @@
+from __future__ import annotations
+import ast
+from ast import AST, Assign, AugAssign, Expr, FunctionDef, arg, stmt
+from bisect import bisect_right
+from automata import InferenceSession, State, StatesCreated
+from builtIns import builtInsScope
+from checker import PRUNE_INTERVAL, LiveRoots
+from dependencies import DependencyLog, Shape, Signature
+from scope import Variable
+from schemes import Scheme
+from serialization import DecodeStates, DumpVariables, EncodeStates, LoadVariables
+from simplification import PruneFlows
+from type_visitors import TypeVisitor
+
+class Checkpoint:
+    # Inference state between two top-level statements: the automaton of
+    # every variable typed so far and the bindings of the top-level scope.
+    # The states are encoded, later statements merge into the live ones.
+    def __init__(self, visitor : TypeVisitor):
+        variables : list[Variable] = []
+        index : dict[int, int] = {}
+        for var in TypeVisitor.typedVariables + [var for (_, var) in visitor.scope.mapping]:
+            if id(var) not in index:
+                index[id(var)] = len(variables)
+                variables.append(var)
+        self.graph     = EncodeStates([var.state for var in variables])
+        self.variables = [(var.name, var.node, var.state.scheme) for var in variables]
+        self.typed     : list[int] = [index[id(var)] for var in TypeVisitor.typedVariables]
+        self.mapping   : list[tuple[str, int]] = [(name, index[id(var)]) for (name, var) in visitor.scope.mapping]
+
+    def Size(self) -> int:
+        return len(self.graph[0])
+
+    def Restore(self) -> TypeVisitor:
+        states = DecodeStates(self.graph)
+        variables : list[Variable] = []
+        for ((name, node, scheme), root) in zip(self.variables, self.graph[2]):
+            state = states[root]
+            state.scheme = scheme
+            variables.append(Variable(name, node, state))
+        TypeVisitor.Reset()
+        TypeVisitor.typedVariables = [variables[i] for i in self.typed]
+        visitor = TypeVisitor(builtInsScope)
+        for (name, i) in self.mapping:
+            visitor.scope.Add(name, variables[i])
+        return visitor
+
+def NameSpan(var : Variable) -> tuple[tuple[int, int], tuple[int, int]] | None:
+    # Source range of the name a variable binds, columns as in the AST
+    node = var.node
+    if type(node) == FunctionDef:
+        start = node.col_offset + len("def ")
+        return ((node.lineno, start), (node.lineno, start + len(node.name)))
+    if type(node) == arg:
+        return ((node.lineno, node.col_offset), (node.lineno, node.col_offset + len(node.arg)))
+    if node.end_lineno is None or node.end_col_offset is None:
+        return None
+    return ((node.lineno, node.col_offset), (node.end_lineno, node.end_col_offset))
+
+class PositionIndex:
+    # Typed variables by the position of their name. Name ranges do not
+    # overlap, so the range starting last before a position is the only
+    # candidate. Variables sharing a name keep the first binding.
+    def __init__(self, variables : list[Variable]):
+        spans : dict[tuple[int, int], tuple[tuple[int, int], Variable]] = {}
+        for var in variables:
+            span = NameSpan(var)
+            if span is not None and span[0] not in spans:
+                spans[span[0]] = (span[1], var)
+        self.starts : list[tuple[int, int]] = sorted(spans)
+        self.spans  : list[tuple[tuple[int, int], Variable]] = [spans[start] for start in self.starts]
+
+    def Find(self, line : int, col : int) -> Variable | None:
+        i = bisect_right(self.starts, (line, col)) - 1
+        if i < 0:
+            return None
+        (end, var) = self.spans[i]
+        return var if (line, col) < end else None
+
+class StatementRecord:
+    # Inferred bindings of a top-level statement whose types only depend on
+    # its source, the schemes it calls and the values it reads, with those
+    # schemes' signatures and the values' shapes.
+    def __init__(self, dependencies : list[tuple[str, str]], values : list[tuple[str, str]], visitor : TypeVisitor, node : stmt, firstTyped : int, firstBound : int):
+        variables : list[Variable] = []
+        index : dict[int, int] = {}
+        for var in TypeVisitor.typedVariables[firstTyped:] + [var for (_, var) in visitor.scope.mapping[firstBound:]]:
+            if id(var) not in index:
+                index[id(var)] = len(variables)
+                variables.append(var)
+        self.dependencies : list[tuple[str, str]] = dependencies
+        self.values       : list[tuple[str, str]] = values
+        self.data         : bytes | None = DumpVariables(variables, node)
+        self.schemes      : list[Scheme | None] = [var.state.scheme for var in variables]
+        self.typed        : list[int] = [index[id(var)] for var in TypeVisitor.typedVariables[firstTyped:]]
+        self.bound        : list[tuple[str, int]] = [(name, index[id(var)]) for (name, var) in visitor.scope.mapping[firstBound:]]
+
+    def Replay(self, visitor : TypeVisitor, node : stmt):
+        variables = LoadVariables(self.data, node) #type: ignore
+        for (var, scheme) in zip(variables, self.schemes):
+            var.state.scheme = scheme
+        TypeVisitor.typedVariables.extend(variables[i] for i in self.typed)
+        for (name, i) in self.bound:
+            visitor.scope.Add(name, variables[i])
+
+class Document:
+    # Results of the last check of one file. A new version is checked from
+    # the last checkpoint before its first changed top-level statement.
+    # Checkpoints are taken once the inference has created as many states
+    # as the previous checkpoint holds, which keeps their cost linear.
+    # After that, statements with an unchanged source that call the same
+    # schemes and read the same values as before are bound from their
+    # records instead of inferred.
+    def __init__(self):
+        self.lines       : list[str] = []
+        # Last line of every checked top-level statement
+        self.ends        : list[int] = []
+        # (index of the next statement, checkpoint), by increasing index
+        self.checkpoints : list[tuple[int, Checkpoint]] = []
+        self.variables   : list[Variable] = []
+        self.index       : PositionIndex = PositionIndex([])
+        self.error       : Exception | None = None
+        self.errorNode   : AST | None = None
+        self.rechecked   : int = 0
+        self.reused      : int = 0
+        # Records of the statements by their source
+        self.records     : dict[str, list[StatementRecord]] = {}
+
+    def Check(self, text : str):
+        # Raises SyntaxError and keeps the previous results when text does
+        # not parse. Statements that end before the first changed line in
+        # both versions are unchanged.
+        tree = ast.parse(text)
+        lines = text.splitlines()
+        changed = 0
+        while changed < min(len(lines), len(self.lines)) and lines[changed] == self.lines[changed]:
+            changed += 1
+        ends = [statement.end_lineno or statement.lineno for statement in tree.body]
+        first = 0
+        while first < min(len(ends), len(self.ends)) and max(ends[first], self.ends[first]) <= changed:
+            first += 1
+        while self.checkpoints and self.checkpoints[-1][0] > first:
+            self.checkpoints.pop()
+
+        if self.checkpoints:
+            (first, checkpoint) = self.checkpoints[-1]
+            visitor = checkpoint.Restore()
+        else:
+            TypeVisitor.Reset()
+            visitor = TypeVisitor(builtInsScope)
+            checkpoint = Checkpoint(visitor)
+            self.checkpoints.append((0, checkpoint))
+            first = 0
+        self.lines = lines
+        self.ends = ends
+        self.error = None
+        self.errorNode = None
+        self.rechecked = 0
+        self.reused = 0
+
+        with InferenceSession():
+            nextPrune = StatesCreated() + PRUNE_INTERVAL
+            nextCheckpoint = StatesCreated() + checkpoint.Size()
+            for (i, statement) in enumerate(tree.body[first:], first + 1):
+                try:
+                    if type(statement) in REPLAYABLE:
+                        self.CheckStatement(visitor, statement, lines)
+                    else:
+                        self.rechecked += 1
+                        visitor.visit(statement)
+                except Exception as e:
+                    self.error = e
+                    self.errorNode = statement
+                    break
+                if StatesCreated() >= nextPrune:
+                    stats = PruneFlows(LiveRoots(visitor))
+                    nextPrune = StatesCreated() + max(PRUNE_INTERVAL, stats.statesAfter)
+                if StatesCreated() >= nextCheckpoint:
+                    checkpoint = Checkpoint(visitor)
+                    self.checkpoints.append((i, checkpoint))
+                    nextCheckpoint = StatesCreated() + checkpoint.Size()
+
+        self.variables = TypeVisitor.typedVariables
+        self.index = PositionIndex(self.variables)
+        sources = {Source(lines, statement) for statement in tree.body if type(statement) in REPLAYABLE}
+        self.records = {source: records for (source, records) in self.records.items() if source in sources}
+
+    def CheckStatement(self, visitor : TypeVisitor, node : stmt, lines : list[str]):
+        source = Source(lines, node)
+        records = self.records.setdefault(source, [])
+        for record in records:
+            if all(Calls(visitor, name, signature) for (name, signature) in record.dependencies) and all(Reads(visitor, name, shape) for (name, shape) in record.values):
+                record.Replay(visitor, node)
+                self.reused += 1
+                return
+
+        self.rechecked += 1
+        firstTyped = len(TypeVisitor.typedVariables)
+        firstBound = len(visitor.scope.mapping)
+        log = DependencyLog(visitor.scope, True)
+        TypeVisitor.dependencyLog = log
+        try:
+            visitor.visit(node)
+        finally:
+            TypeVisitor.dependencyLog = None
+        results = [var.state for var in TypeVisitor.typedVariables[firstTyped:]]
+        results.extend(var.state for (_, var) in visitor.scope.mapping[firstBound:])
+        found = log.Dependencies(results)
+        if found is None:
+            return
+        (dependencies, values) = found
+        record = StatementRecord(dependencies, values, visitor, node, firstTyped, firstBound)
+        if record.data is None:
+            return
+        records[:] = [r for r in records if (r.dependencies, r.values) != found]
+        if type(node) == FunctionDef:
+            scheme = visitor.scope.bindings[node.name].state.scheme #type: ignore
+            if scheme is not None:
+                scheme.signature = Signature(source, dependencies + values)
+        records.append(record)
+
+# Statements that can only change the automaton through the names they load.
+# Loops and branches also combine the outer bindings they rebind.
+REPLAYABLE = (FunctionDef, Assign, AugAssign, Expr)
+
+def Source(lines : list[str], node : stmt) -> str:
+    return "\n".join(lines[node.lineno - 1:node.end_lineno])
+
+def Calls(visitor : TypeVisitor, name : str, signature : str) -> bool:
+    # Whether name is bound to the scheme with this signature
+    variable = visitor.Lookup(name)
+    if variable is None or variable.state.scheme is None:
+        return False
+    return variable.state.scheme.signature == signature
+
+def Reads(visitor : TypeVisitor, name : str, shape : str) -> bool:
+    # Whether name is bound to a value of this shape
+    variable = visitor.Lookup(name)
+    return variable is not None and Shape(variable.state) == shape
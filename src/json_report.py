@@ -0,0 +1,103 @@
+import ast
+import json
+from typing import TextIO
+from ast import AST, FunctionDef
+from dependencies import DependencyLog
+from exceptions import BudgetExceeded, ToolError
+from pretty_printing import FormatStates, FormatType
+from scope import Variable
+from type_visitors import TypeVisitor
+import profiling
+
+class JsonLinesReport:
+    # Writes one JSON object per line and flushes after every top-level
+    # statement, so a consumer can read the types of a statement while the
+    # rest of the file is still being checked. Types are rendered from copies
+    # when the statement that binds them finishes, all variables of one
+    # statement together. A later statement that uses a name other than by
+    # calling it can still add to its type, the statement with the latest
+    # binding of the name is rendered again and changed types are sent as
+    # updates. The names a statement uses come from a dependency log.
+    def __init__(self, out: TextIO):
+        self.out      : TextIO = out
+        self.written  : int = 0
+        self.finished : int = 0
+        self.errors   : int = 0
+        # Errors of statements that were recovered from, see TypeVisitor.recover
+        self.recovered: int = 0
+        # Variables and rendered types per top-level statement, and the
+        # statement that bound each name last
+        self.groups   : list[tuple[list[Variable], list[str]]] = []
+        self.binders  : dict[str, int] = {}
+
+    def Write(self, record: dict):
+        self.out.write(json.dumps(record) + "\n")
+
+    def Ast(self, tree: AST):
+        self.Write({"kind": "ast", "dump": ast.dump(tree)})
+        self.out.flush()
+
+    def BuiltIns(self, variables: list[Variable]):
+        for var in variables:
+            self.Write({"kind": "builtin", "name": var.name, "type": FormatType(var.state)})
+        self.out.flush()
+
+    def Statement(self, visitor: TypeVisitor, statement: AST):
+        profiler = profiling.profiler
+        if profiler:
+            profiler.Enter("print")
+        try:
+            log = TypeVisitor.dependencyLog
+            used = log.Values() if log is not None else []
+            changed = sorted({self.binders[name] for name in used if name in self.binders})
+            for i in changed:
+                (variables, rendered) = self.groups[i]
+                for (j, text) in enumerate(FormatStates([var.state for var in variables])):
+                    if text != rendered[j]:
+                        rendered[j] = text
+                        self.Write(Record("update", variables[j], text))
+
+            for error in TypeVisitor.errors[self.recovered:]:
+                self.Error(error)
+            self.recovered = len(TypeVisitor.errors)
+
+            variables = TypeVisitor.typedVariables[self.written:]
+            rendered = FormatStates([var.state for var in variables])
+            for (var, text) in zip(variables, rendered):
+                self.Write(Record("function" if type(var.node) == FunctionDef else "variable", var, text))
+                self.binders[var.name] = len(self.groups)
+            self.groups.append((variables, rendered))
+            self.written += len(variables)
+            self.finished += 1
+            self.out.flush()
+            TypeVisitor.dependencyLog = DependencyLog(visitor.scope)
+        finally:
+            if profiler:
+                profiler.Exit()
+
+    def Error(self, error: Exception, tree: AST | None = None):
+        if isinstance(error, SyntaxError):
+            (line, column, message) = (error.lineno, (error.offset or 1) - 1, error.msg)
+        elif isinstance(error, ToolError):
+            (line, column, message) = (error.node.lineno, error.node.col_offset, error.message)
+        else:
+            # Errors without a node are located at the statement that raised them
+            node = tree.body[self.finished] #type: ignore
+            (line, column, message) = (node.lineno, node.col_offset, str(error))
+        self.Write({"kind": "error", "line": line, "column": column, "message": message})
+        self.errors += 1
+        self.out.flush()
+
+    def TooComplex(self, exceeded: BudgetExceeded, tree: AST):
+        # The check stopped in the statement after the last finished one
+        node = tree.body[self.finished] if self.finished < len(tree.body) else tree #type: ignore
+        self.Write(dict({"kind": "too complex", "line": getattr(node, "lineno", 0), "limit": exceeded.limit}, **exceeded.counters))
+        self.out.flush()
+
+    def Done(self):
+        TypeVisitor.dependencyLog = None
+        self.Write({"kind": "done", "variables": self.written, "errors": self.errors})
+        self.out.flush()
+
+def Record(kind: str, var: Variable, rendered: str) -> dict:
+    return {"kind": kind, "name": var.name, "line": var.node.lineno, "column": var.node.col_offset, "type": rendered}
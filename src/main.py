@@ -1,35 +1,168 @@
 import ast
+import sys
+from argparse import ArgumentParser
 from pretty_printing import PrettyPrint
 from type_visitors import TypeVisitor
-from builtIns import builtInsScope
-import sys
-from scope import Scope
+from builtIns import BuiltInVariables
+from checker import CheckTree
+from automata import Budget, InferenceSession
+from exceptions import BudgetExceeded
+from signature_cache import SignatureCache
+from json_report import JsonLinesReport
+from annotate import Annotate, OutputPath, WriteOutput
+import simplification
+import profiling
+import stubs
 
-def Main(filename: str, debug: bool = True):
+def Main(filename: str, debug: bool = True, session: InferenceSession | None = None, sessionStats: bool = False, showAst: bool = False, showBuiltIns: bool = False):
     with open(filename, 'r') as file:
         code = file.read()
     tree = ast.parse(code)
 
-    errorMessage = ""
-    visitor = TypeVisitor(builtInsScope)
-    if not debug:
-        try:
-            visitor.InferTypes(tree)
-        except Exception as e:
-            errorMessage:str = str(e)
-    else:
-        visitor.InferTypes(tree)
-    
-    print("== AST =======================")
-    print(ast.dump(tree, indent=2))
-    print("== BuiltIns Types ============")
-    PrettyPrint([x[1] for x in builtInsScope.mapping])
-    print("== Input Program Types  ======")
-    PrettyPrint(TypeVisitor.typedVariables)
+    session = session or InferenceSession()
+    profiler = profiling.profiler
+    if profiler:
+        profiler.Enter("check")
+    try:
+        errorMessage = CheckTree(tree, debug, session)
+    finally:
+        if profiler:
+            profiler.Exit()
+
+    if showAst:
+        print("== AST =======================")
+        print(ast.dump(tree, indent=2))
+    if profiler:
+        profiler.Enter("print")
+    try:
+        if showBuiltIns:
+            print("== BuiltIns Types ============")
+            PrettyPrint(BuiltInVariables())
+        print("== Input Program Types  ======")
+        PrettyPrint(TypeVisitor.typedVariables)
+    finally:
+        if profiler:
+            profiler.Exit()
     print(errorMessage)
+    if TypeVisitor.signatureCache:
+        print("== Signature cache: {}".format(TypeVisitor.signatureCache))
+    if sessionStats:
+        print("== Biunify cache: {}".format(session))
+        print("== Loop passes: {}".format(TypeVisitor.loopStats))
+        print("== Call memo: {}".format(TypeVisitor.callStats))
+        if stubs.library:
+            print("== Stub library: {}".format(stubs.library))
+    if simplification.report:
+        print("== Simplification ============")
+        print(simplification.report)
 
+def MainJsonLines(filename: str, session: InferenceSession | None = None, showAst: bool = False, showBuiltIns: bool = False):
+    with open(filename, 'r') as file:
+        code = file.read()
+    report = JsonLinesReport(sys.stdout)
+    try:
+        tree = ast.parse(code, filename)
+    except SyntaxError as e:
+        report.Error(e)
+        report.Done()
+        return
+
+    if showAst:
+        report.Ast(tree)
+    if showBuiltIns:
+        report.BuiltIns(BuiltInVariables())
+    profiler = profiling.profiler
+    if profiler:
+        profiler.Enter("check")
+    try:
+        CheckTree(tree, True, session, report.Statement)
+    except OSError:
+        raise
+    except Exception as e:
+        report.Error(e, tree)
+    except BudgetExceeded as e:
+        report.TooComplex(e, tree)
+    finally:
+        if profiler:
+            profiler.Exit()
+    report.Done()
+
+def MainAnnotate(filename: str, kind: str, outputDir: str | None = None, session: InferenceSession | None = None):
+    with open(filename, 'rb') as file:
+        source = file.read()
+    tree = ast.parse(source, filename)
+    errorMessage = CheckTree(tree, False, session)
+    if errorMessage:
+        print(errorMessage, file=sys.stderr)
+    data = Annotate(source, tree, TypeVisitor.typedVariables, kind)
+    if outputDir:
+        WriteOutput(OutputPath(filename, outputDir, kind), data)
+    else:
+        sys.stdout.buffer.write(data)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        raise Exception("Requires arguments, use: main.py <filename>")
-    Main(sys.argv[1], False)
\ No newline at end of file
+    parser = ArgumentParser(description="Typhon: type inference for Python",
+                            epilog="TYPHON_STATES=arena stores the automata in compact arrays, which trades time for memory: "
+                                   "about half the memory, about twice the time.")
+    parser.add_argument("files", nargs="+", help="file to check, or directories/globs/@filelist with --batch")
+    parser.add_argument("--batch", action="store_true", help="check many files on a process pool")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes in batch mode")
+    parser.add_argument("--function-workers", type=int, default=None, metavar="N", help="infer the independent top-level functions of a single file on N processes")
+    parser.add_argument("--report", default=None, help="write the batch report as JSON to this file")
+    parser.add_argument("--cache-dir", default=None, help="directory of the persistent function signature cache")
+    parser.add_argument("--cache-size", type=int, default=64, help="maximum size of the signature cache in MB")
+    parser.add_argument("--biunify-cache-size", type=int, default=None, help="bound the number of memoized Biunify pairs per file")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="print the types as text at the end, or stream them as JSON Lines per top-level statement")
+    parser.add_argument("--annotate", choices=["py", "pyi"], default=None, help="write the source with type annotations, or a stub, instead of the types")
+    parser.add_argument("--output-dir", default=None, help="directory for the annotated files, stdout for a single file by default")
+    parser.add_argument("--max-seconds", type=float, default=None, help="stop checking a file as too complex after this many seconds, read every 64 visits or Biunify calls and every 256 Biunify steps")
+    parser.add_argument("--max-states", type=int, default=None, help="stop checking a file as too complex after it created this many states")
+    parser.add_argument("--max-steps", type=int, default=None, help="stop checking a file as too complex after this many Biunify steps")
+    parser.add_argument("--recover", action="store_true", help="report every type error, names bound by failing statements get the type error")
+    parser.add_argument("--ast", action="store_true", help="also print the syntax tree")
+    parser.add_argument("--builtins", action="store_true", help="also print the types of the builtins")
+    parser.add_argument("--session-stats", action="store_true", help="print the Biunify cache, loop pass, call memo and stub library counters of the run")
+    parser.add_argument("--simplification-report", action="store_true", help="print state and edge counts of the automaton simplification")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="FILE", help="write time, calls and allocated states per phase as JSON to FILE or stderr")
+    args = parser.parse_args()
+    cacheBytes = args.cache_size * 1024 * 1024
+    limits = (args.max_seconds, args.max_states, args.max_steps)
+    if limits == (None, None, None):
+        limits = None
+
+    if args.batch and args.function_workers:
+        parser.error("--function-workers checks a single file, batch mode spreads files over --workers")
+    if args.batch and args.profile:
+        parser.error("--profile checks a single file, it cannot be combined with --batch")
+    if args.batch and args.annotate and not args.output_dir:
+        parser.error("--annotate needs --output-dir in batch mode")
+    if args.batch:
+        from batch import RunBatch, PrintReport
+        PrintReport(RunBatch(args.files, args.workers, args.cache_dir, cacheBytes, args.biunify_cache_size, args.annotate, args.output_dir, args.recover, limits), args.report)
+    else:
+        TypeVisitor.recover = args.recover
+        if args.cache_dir:
+            TypeVisitor.signatureCache = SignatureCache(args.cache_dir, cacheBytes)
+        if args.function_workers:
+            from parallel import InferFunctions
+            with open(args.files[0], 'rb') as file:
+                TypeVisitor.prefetched = InferFunctions(file.read(), args.files[0], args.function_workers)
+        if args.simplification_report:
+            simplification.report = simplification.SimplificationReport()
+        if args.profile:
+            profiling.profiler = profiling.Profiler()
+        session = InferenceSession(args.biunify_cache_size, Budget(*limits) if limits else None)
+        exitCode = 0
+        try:
+            if args.annotate:
+                MainAnnotate(args.files[0], args.annotate, args.output_dir, session)
+            elif args.format == "jsonl":
+                MainJsonLines(args.files[0], session, args.ast, args.builtins)
+            else:
+                Main(args.files[0], False, session, args.session_stats, args.ast, args.builtins)
+        except BudgetExceeded as e:
+            print(e)
+            exitCode = 3
+        if profiling.profiler:
+            profiling.profiler.Write(args.profile)
+        sys.exit(exitCode)
@@ -0,0 +1,119 @@
+import ast
+from ast import FunctionDef, Module
+from concurrent.futures import ProcessPoolExecutor
+from automata import InferenceSession, State
+from builtIns import builtInsScope
+from schemes import Scheme
+from scope import Variable
+from serialization import DumpVariables, EncodedGraph
+from type_visitors import BoundNames, FreeNames, TypeVisitor
+
+# Top-level functions only see the bindings before them and cannot change
+# globals, so a function whose free names are builtins and earlier
+# functions it only calls can be inferred on its own once those functions
+# are. Workers infer them level by level of their dependencies, a task per
+# chunk of a level, and send back the variables of each function with its
+# simplified scheme. The file is then checked as usual, the check installs
+# both in place of visiting the body, see TypeVisitor.visit_FunctionDef.
+
+# Results of a function by the position of its definition: its variables as
+# DumpVariables stores them and the graph of its scheme
+Prefetched = dict[tuple[int, int], tuple[bytes, EncodedGraph]]
+
+def FunctionDependencies(tree: Module) -> dict[int, list[int]]:
+    # Top-level index of every function that can be inferred in a worker,
+    # with the functions its free names refer to. The latest binding of a
+    # free name before the function has to be such a function itself, which
+    # the function only calls.
+    latest: dict[str, int] = {}
+    functions: dict[int, list[int]] = {}
+    for (i, statement) in enumerate(tree.body):
+        if type(statement) == FunctionDef:
+            params = {arg.arg for arg in statement.args.args}
+            (names, values) = FreeNames(statement)
+            dependencies = sorted({latest[name] for name in names - params if name in latest})
+            if all(j in functions for j in dependencies) and not (values - params) & latest.keys():
+                functions[i] = dependencies
+        for name in BoundNames(statement):
+            latest[name] = i
+    return functions
+
+def Levels(functions: dict[int, list[int]]) -> list[list[int]]:
+    # Functions of a level only depend on those of lower levels
+    level: dict[int, int] = {}
+    levels: list[list[int]] = []
+    for i in sorted(functions):
+        level[i] = max((level[j] + 1 for j in functions[i]), default=0)
+        if level[i] == len(levels):
+            levels.append([])
+        levels[level[i]].append(i)
+    return levels
+
+# The checked file, parsed once per worker
+tree: Module | None = None
+
+def InitWorker(source: bytes, filename: str, skipPrintAndInput: bool):
+    global tree
+    tree = ast.parse(source, filename)
+    TypeVisitor.skipPrintAndInput = skipPrintAndInput
+
+def InferFunction(index: int, dependencies: list[int], schemes: dict[int, Scheme]) -> tuple[bytes, EncodedGraph] | None:
+    # None when the function has an error, the check reports it
+    assert(tree)
+    TypeVisitor.Reset()
+    visitor = TypeVisitor(builtInsScope)
+    try:
+        with InferenceSession():
+            # The function only calls its dependencies, which instantiates
+            # their schemes, their states are never read
+            for j in dependencies:
+                dependency: FunctionDef = tree.body[j] #type: ignore
+                state = State(True)
+                state.scheme = schemes[j]
+                visitor.scope.Add(dependency.name, Variable(dependency.name, dependency, state))
+            node: FunctionDef = tree.body[index] #type: ignore
+            visitor.visit(node)
+    except Exception:
+        return None
+    data = DumpVariables(TypeVisitor.typedVariables, node)
+    scheme = TypeVisitor.typedVariables[0].state.scheme
+    assert(scheme)
+    return (data, scheme.graph) if data is not None else None
+
+def InferChunk(chunk: list[tuple[int, list[int]]], graphs: dict[int, EncodedGraph]) -> list[tuple[int, bytes, EncodedGraph]]:
+    # Functions of one level with their dependencies, and the scheme graphs
+    # of those. Each scheme is shared by every function of the chunk.
+    schemes = {j: Scheme.FromGraph(graph) for (j, graph) in graphs.items()}
+    results = []
+    for (i, dependencies) in chunk:
+        result = InferFunction(i, dependencies, schemes)
+        if result is not None:
+            results.append((i, *result))
+    return results
+
+def InferFunctions(source: bytes, filename: str, workers: int) -> Prefetched:
+    try:
+        tree = ast.parse(source, filename)
+    except (SyntaxError, ValueError):
+        return {}
+    functions = FunctionDependencies(tree)
+    if len(functions) < 2:
+        return {}
+
+    results: dict[int, tuple[bytes, EncodedGraph]] = {}
+    with ProcessPoolExecutor(workers, initializer=InitWorker, initargs=(source, filename, TypeVisitor.skipPrintAndInput)) as pool:
+        for level in Levels(functions):
+            # Functions that depend on a failed one are left to the check
+            ready = [(i, functions[i]) for i in level if all(j in results for j in functions[i])]
+            if not ready:
+                break
+            size = -(-len(ready) // workers)
+            futures = []
+            for start in range(0, len(ready), size):
+                chunk = ready[start:start + size]
+                graphs = {j: results[j][1] for (_, dependencies) in chunk for j in dependencies}
+                futures.append(pool.submit(InferChunk, chunk, graphs))
+            for future in futures:
+                for (i, data, graph) in future.result():
+                    results[i] = (data, graph)
+    return {(tree.body[i].lineno, tree.body[i].col_offset): result for (i, result) in results.items()}
@@ -1,49 +1,87 @@
-from typing import TypeVar
 from scope import Variable
-from automata import Function, Record, TypeVariable
-
-
-def ReplaceFlowRecord(h : Record, name : str):
-    for key in h.fields.keys():
-        valName = "{}_{}".format(name, key)
-        val = h.fields[key]
-        tvarHead = TypeVariable(valName)
-        if val.flows:
-            val.heads.add(tvarHead)
-            for f in val.flows:
-                f.heads.add(tvarHead)
-
-        for head in val.heads:
-            if isinstance(head, Record):
-                ReplaceFlowRecord(head, valName)
-            elif isinstance(head, Function):
-                ReplaceFlowFunction(head, valName)
-
-def ReplaceFlowFunction(h : Function, name: str):
-    for i in range(len(h.parameters)):
-        argName: str = "{}_{}".format(name, i)
-        p = h.parameters[i]
-        tvarHead = TypeVariable(argName)
-        p.heads.add(tvarHead)
-        for f in p.flows:
-            f.heads.add(tvarHead)
-        
-        for head in p.heads:
-            if isinstance(head, Record):
-                ReplaceFlowRecord(head, argName)
-            elif isinstance(head, Function):
-                ReplaceFlowFunction(head, argName)
+from automata import DictHead, Function, Head, IterHead, Record, State
 
-def PrettyPrint(variables : list[Variable]):
-    for var in variables:
-        for h in var.state.heads:
-            if type(h) == Function:
-                ReplaceFlowFunction(h, "T")
 
-    for v in variables:
-        print(v)
-    
+class Renderer:
+    # Renders types without changing the graph. The parameters of every
+    # function type reachable from the roots, and the record fields below
+    # them that have flows, name a type variable T_<index> (T_<index>_<field>
+    # further down). It labels the state and the states it flows with, the
+    # labels are kept in a side table. Every head is named once and every
+    # state is rendered once.
+    def __init__(self, roots : list[State]):
+        self.labels  : dict[int, list[str]] = {}
+        self.strings : dict[int, str] = {}
+        self.active  : set[int] = set()
+        named : set[int] = set()
+        work : list[tuple[Head, str]] = []
+        for root in roots:
+            work.extend(reversed([(h, "T") for h in root.heads if type(h) == Function]))
+            while work:
+                (head, name) = work.pop()
+                if id(head) in named:
+                    continue
+                named.add(id(head))
+                children : list[tuple[Head, str]] = []
+                if type(head) == Function:
+                    for (i, p) in enumerate(head.parameters): #type: ignore
+                        children.extend(self.Label(p, "{}_{}".format(name, i), True))
+                else:
+                    for (key, value) in head.fields.items(): #type: ignore
+                        children.extend(self.Label(value, "{}_{}".format(name, key), bool(value.flows)))
+                work.extend(reversed(children))
+
+    def Label(self, state : State, name : str, labeled : bool) -> list[tuple[Head, str]]:
+        if labeled:
+            for q in (state, *state.flows):
+                labels = self.labels.setdefault(id(q), [])
+                if name not in labels:
+                    labels.append(name)
+        return [(h, name) for h in state.heads if type(h) == Function or isinstance(h, Record)]
+
+    def Render(self, state : State) -> str:
+        key = id(state)
+        text = self.strings.get(key)
+        if text is not None:
+            return text
+        # A type that contains itself is cut where it repeats
+        if key in self.active:
+            return "..."
+        self.active.add(key)
+        parts = {self.RenderHead(h) for h in state.heads}
+        parts.update(self.labels.get(key, ()))
+        self.active.discard(key)
+        # Heads are a set, sorting makes the text independent of their order
+        text = "|".join(sorted(parts))
+        self.strings[key] = text
+        return text
 
+    def RenderHead(self, head : Head) -> str:
+        if type(head) == Function:
+            parameters = ",".join(self.Render(p) for p in head.parameters) #type: ignore
+            return "({}->{})".format(parameters, self.Render(head.result)) #type: ignore
+        if isinstance(head, Record):
+            fields = head.fields
+            if type(head) == DictHead:
+                return "{}[{},{}]".format(self.Render(fields["type"]), self.Render(fields["keys"]), self.Render(fields["values"]))
+            if isinstance(head, IterHead):
+                return "{}[{}]".format(self.Render(fields["type"]), self.Render(fields["values"]))
+            return "rec[{}]".format(",".join("{}:{}".format(key, self.Render(value)) for (key, value) in fields.items()))
+        return str(head)
 
+def FormatTypes(variables : list[Variable], renderer : Renderer | None = None) -> list[str]:
+    renderer = renderer or Renderer([var.state for var in variables])
+    return ["(Ln{} Col{}) type({})={}".format(v.node.lineno, v.node.col_offset, v.name, renderer.Render(v.state)) for v in variables]
 
- 
+def FormatStates(states : list[State]) -> list[str]:
+    # States rendered together share the names of their type variables, as
+    # a function and the variables of its body do
+    renderer = Renderer(states)
+    return [renderer.Render(state) for state in states]
+
+def FormatType(state : State) -> str:
+    return FormatStates([state])[0]
+
+def PrettyPrint(variables : list[Variable]):
+    for line in FormatTypes(variables):
+        print(line)
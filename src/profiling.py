@@ -0,0 +1,64 @@
+from __future__ import annotations
+import json
+import sys
+import time
+import automata
+
+class Bucket:
+    __slots__ = ("seconds", "own", "calls", "states")
+
+    def __init__(self):
+        self.seconds: float = 0.0
+        self.own    : float = 0.0
+        self.calls  : int = 0
+        self.states : int = 0
+
+    def ToDict(self) -> dict:
+        return {"seconds": self.seconds, "self": self.own, "calls": self.calls, "states": self.states}
+
+class Profiler:
+    # Cumulative time, calls and allocated States per named bucket. Nested
+    # buckets are included in the time of the enclosing ones, "self" is the
+    # time not spent in nested buckets.
+    def __init__(self):
+        self.buckets: dict[str, Bucket] = {}
+        # (name, start time, states created before, time in nested buckets)
+        self.stack  : list[list] = []
+        self.start  : float = time.perf_counter()
+
+    def Enter(self, name: str):
+        self.stack.append([name, time.perf_counter(), automata.StatesCreated(), 0.0])
+
+    def Exit(self):
+        end = time.perf_counter()
+        created = automata.StatesCreated()
+        (name, start, before, nested) = self.stack.pop()
+        seconds = end - start
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = Bucket()
+            self.buckets[name] = bucket
+        bucket.seconds += seconds
+        bucket.own     += seconds - nested
+        bucket.calls   += 1
+        bucket.states  += created - before
+        if self.stack:
+            self.stack[-1][3] += seconds
+
+    def ToDict(self) -> dict:
+        buckets = sorted(self.buckets.items(), key=lambda item: item[1].seconds, reverse=True)
+        return {
+            "seconds": time.perf_counter() - self.start,
+            "buckets": {name: bucket.ToDict() for (name, bucket) in buckets},
+        }
+
+    def Write(self, path: str):
+        # Without a file the profile goes to stderr, stdout carries the types
+        if path == "-":
+            print(json.dumps(self.ToDict(), indent=1), file=sys.stderr)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.ToDict(), f, indent=1)
+
+# Hooks check this before measuring, so they cost one lookup when disabled
+profiler: Profiler | None = None
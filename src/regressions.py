@@ -0,0 +1,364 @@
+import ast
+import builtins
+import gc
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import automata
+import profiling
+import stubs
+from annotate import Annotate
+from automata import Budget, InferenceSession, State, StatesCreated
+from checker import CheckTree
+from exceptions import BudgetExceeded
+from incremental import Document
+from json_report import JsonLinesReport
+from pretty_printing import FormatTypes
+from server import METHOD_NOT_FOUND, ReadMessage, Server, WriteMessage
+from signature_cache import SignatureCache
+from type_visitors import TypeVisitor
+
+# Every program in resources/regressions lists the errors a check with
+# recovery has to report as "# error: <error>" comments, none for a clean
+# program. A check with a cold and then a warm signature cache, and checks
+# whose Biunify hands pairs to its worklist below the usual depth, have to
+# give the same types and errors as a plain one, and so does a Document
+# after edits. Checks in interpreters with different hash seeds have to
+# print the same text. The checks in CHECKS cover budgets, profiles, the
+# stub library, the language server, JSON Lines and annotated output.
+# Prints the programs and checks that fail.
+
+REGRESSIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "regressions")
+
+def Check(filename: str) -> tuple[set[str], set[str]]:
+    with open(filename) as file:
+        source = file.read()
+    expected = {line[len("# error: "):].strip() for line in source.splitlines() if line.startswith("# error: ")}
+    TypeVisitor.recover = True
+    TypeVisitor.skipPrintAndInput = True
+    errors = CheckTree(ast.parse(source, filename))
+    return (expected, set(filter(None, errors.splitlines())))
+
+def Types(filename: str) -> list[str]:
+    with open(filename) as file:
+        source = file.read()
+    TypeVisitor.recover = True
+    TypeVisitor.skipPrintAndInput = True
+    errors = CheckTree(ast.parse(source, filename))
+    return FormatTypes(TypeVisitor.typedVariables) + errors.splitlines()
+
+def CheckCache(filename: str) -> list[str]:
+    # The runs whose types differ from a check without the cache
+    expected = Types(filename)
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        TypeVisitor.signatureCache = SignatureCache(directory)
+        try:
+            for run in ("cold cache", "warm cache"):
+                if Types(filename) != expected:
+                    failed.append(run)
+        finally:
+            TypeVisitor.signatureCache = None
+    return failed
+
+def CheckWorklist(filename: str) -> list[str]:
+    # Programs hardly nest deep enough to reach the worklist of Biunify,
+    # these runs hand it every pair, or those below the second level
+    expected = Types(filename)
+    failed = []
+    depth = automata.RECURSION_DEPTH
+    try:
+        for automata.RECURSION_DEPTH in (0, 2):
+            if Types(filename) != expected:
+                failed.append("worklist Biunify from depth {}".format(automata.RECURSION_DEPTH))
+    finally:
+        automata.RECURSION_DEPTH = depth
+    return failed
+
+def Checked(source: str) -> list[str]:
+    # Types and error of a check that stops at the first error
+    error = CheckTree(ast.parse(source))
+    return FormatTypes(TypeVisitor.typedVariables) + [error]
+
+def CheckIncremental(filename: str) -> list[str]:
+    # The value of every single line top-level assignment is put in a list
+    # and taken out again, the Document has to give the types of a fresh
+    # check of each version. Documents stop at the first error.
+    with open(filename) as file:
+        source = file.read()
+    lines = source.splitlines()
+    TypeVisitor.recover = False
+    document = Document()
+    document.Check(source)
+    failed = []
+    try:
+        for statement in ast.parse(source).body:
+            if type(statement) != ast.Assign or statement.end_lineno != statement.lineno:
+                continue
+            edited = lines[:]
+            line = edited[statement.lineno - 1]
+            (start, end) = (statement.value.col_offset, statement.value.end_col_offset)
+            edited[statement.lineno - 1] = "{}[{}]{}".format(line[:start], line[start:end], line[end:])
+            for version in ("\n".join(edited) + "\n", source):
+                document.Check(version)
+                types = FormatTypes(document.variables) + [str(document.error) if document.error is not None else ""]
+                if types != Checked(version):
+                    failed.append("Document after editing line {}".format(statement.lineno))
+    finally:
+        TypeVisitor.recover = True
+    return failed
+
+def Rendered(filename: str, seed: int) -> str:
+    # Types of a check in a new interpreter with this hash seed
+    environment = dict(os.environ, PYTHONHASHSEED=str(seed))
+    return subprocess.run([sys.executable, os.path.abspath(__file__), "--types", filename], env=environment, capture_output=True, text=True, check=True).stdout
+
+def CheckBudget() -> list[str]:
+    # Reading and checking the budget creates no states, and a state limit
+    # stops a check at exactly that many states
+    failed = []
+    budget = Budget()
+    with InferenceSession(None, budget):
+        for _ in range(200):
+            State(True)
+            budget.Tick()
+            budget.Check()
+            budget.Counters()
+        if budget.Counters()["states"] != 200:
+            failed.append("counted {} of 200 states".format(budget.Counters()["states"]))
+    filename = os.path.join(REGRESSIONS_PATH, "unions.py")
+    with open(filename) as file:
+        tree = ast.parse(file.read(), filename)
+    full = Budget()
+    CheckTree(tree, session=InferenceSession(None, full))
+    for limit in (1, 50, full.Counters()["states"] // 2):
+        before = StatesCreated()
+        try:
+            CheckTree(tree, session=InferenceSession(None, Budget(maxStates=limit)))
+            failed.append("max states {} not exceeded".format(limit))
+        except BudgetExceeded as e:
+            if e.limit != "state" or e.counters["states"] != limit or StatesCreated() - before != limit:
+                failed.append("max states {} stopped at {} states: {}".format(limit, StatesCreated() - before, e))
+    return failed
+
+def ProfiledStates(tree: ast.AST, budget: Budget | None) -> tuple[dict[str, int], int]:
+    # The states per bucket of a profiled check, and the states it created
+    profiling.profiler = profiling.Profiler()
+    before = StatesCreated()
+    try:
+        profiling.profiler.Enter("check")
+        CheckTree(tree, session=InferenceSession(None, budget))
+        profiling.profiler.Exit()
+        return ({name: bucket.states for (name, bucket) in profiling.profiler.buckets.items()}, StatesCreated() - before)
+    finally:
+        profiling.profiler = None
+
+def CheckProfile() -> list[str]:
+    # Profiled states are the states created, with or without a budget
+    filename = os.path.join(REGRESSIONS_PATH, "unions.py")
+    with open(filename) as file:
+        tree = ast.parse(file.read(), filename)
+    (states, created) = ProfiledStates(tree, None)
+    failed = []
+    if states["check"] != created:
+        failed.append("profiled {} of {} states".format(states["check"], created))
+    if ProfiledStates(tree, Budget(maxSteps=10**9))[0] != states:
+        failed.append("a budget changes the profiled states")
+    return failed
+
+def CheckStubs() -> list[str]:
+    # The shipped stub library is the one its sources compile to, a check
+    # never has to compile it again
+    with open(stubs.LIBRARY_PATH, 'rb') as file:
+        data = file.read()
+    shipped = stubs.StubLibrary(data)
+    if shipped.digest != stubs.SourceDigest():
+        return ["stubs.bin is compiled from other sources, run python stubs.py"]
+    # Marshal shares equal objects depending on the process, compare values
+    compiled = stubs.StubLibrary(stubs.Compile())
+    return ["stubs.bin differs in {}, bump STUB_FORMAT_VERSION".format(name) for name in compiled.index if name not in shipped.index or shipped.Module(name).graphs != compiled.Module(name).graphs]
+
+def Programs() -> list[str]:
+    return sorted(glob.glob(os.path.join(REGRESSIONS_PATH, "*.py")))
+
+def CheckServer() -> list[str]:
+    # A session of requests and notifications, answered in order
+    uri = "file:///regression.py"
+    requests = [
+        {"id": 1, "method": "initialize", "params": {}},
+        {"method": "textDocument/didOpen", "params": {"textDocument": {"uri": uri, "text": "x = 1\ny = x + \"s\"\n"}}},
+        {"method": "textDocument/didChange", "params": {"textDocument": {"uri": uri}, "contentChanges": [{"text": "x = 1\ny = x + 2.5\n"}]}},
+        {"id": 2, "method": "textDocument/hover", "params": {"textDocument": {"uri": uri}, "position": {"line": 1, "character": 0}}},
+        {"id": 3, "method": "textDocument/definition", "params": {}},
+        {"id": 4, "method": "shutdown"},
+    ]
+    input = io.BytesIO()
+    for request in requests:
+        WriteMessage(input, dict(request, jsonrpc="2.0"))
+    input.seek(0)
+    output = io.BytesIO()
+    try:
+        Server(output).Run(input)
+    finally:
+        gc.enable()
+    output.seek(0)
+    answers = []
+    while (message := ReadMessage(output)) is not None:
+        answers.append(message)
+    expected = [
+        {"id": 1, "result": {"capabilities": {"textDocumentSync": 1, "hoverProvider": True}, "serverInfo": {"name": "typhon"}}},
+        {"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": [{"range": {"start": {"line": 1, "character": 4}, "end": {"line": 1, "character": 11}}, "severity": 1, "source": "typhon", "message": "str is not a subtype of float"}]}},
+        {"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": []}},
+        {"id": 2, "result": {"contents": {"kind": "markdown", "value": "```python\ny: float\n```"}}},
+        {"id": 3, "error": {"code": METHOD_NOT_FOUND, "message": "Unknown method: textDocument/definition"}},
+        {"id": 4, "result": None},
+    ]
+    failed = ["answered {}".format(json.dumps(answer)) for answer in answers if dict(answer, jsonrpc="2.0") not in [dict(e, jsonrpc="2.0") for e in expected]]
+    if len(answers) != len(expected):
+        failed.append("{} answers to {} expected".format(len(answers), len(expected)))
+    return failed
+
+# Keys and their types of every kind of JSON Lines record
+RECORD_KEYS = {
+    "variable": {"name": str, "line": int, "column": int, "type": str},
+    "function": {"name": str, "line": int, "column": int, "type": str},
+    "update": {"name": str, "line": int, "column": int, "type": str},
+    "error": {"line": int, "column": int, "message": str},
+    "too complex": {"line": int, "limit": str, "seconds": float, "states": int, "steps": int},
+    "done": {"variables": int, "errors": int},
+}
+
+def JsonLines(filename: str, budget: Budget | None) -> list[dict]:
+    # The records --format jsonl writes
+    with open(filename) as file:
+        tree = ast.parse(file.read(), filename)
+    out = io.StringIO()
+    report = JsonLinesReport(out)
+    try:
+        CheckTree(tree, True, InferenceSession(None, budget), report.Statement)
+    except Exception as e:
+        report.Error(e, tree)
+    except BudgetExceeded as e:
+        report.TooComplex(e, tree)
+    report.Done()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+def CheckJsonLines() -> list[str]:
+    # Every record has the keys of its kind, the last one counts the others
+    failed = []
+    for filename in Programs():
+        for budget in (None, Budget(maxSteps=2)):
+            records = JsonLines(filename, budget)
+            for record in records:
+                keys = RECORD_KEYS.get(record.get("kind"), {})
+                if not keys or record.keys() != keys.keys() | {"kind"} or not all(isinstance(record[key], kind) or kind == float and type(record[key]) == int for (key, kind) in keys.items()):
+                    failed.append("{}: record {}".format(os.path.basename(filename), json.dumps(record)))
+            counts = {"variables": sum(r["kind"] in ("variable", "function") for r in records), "errors": sum(r["kind"] == "error" for r in records)}
+            if [r["kind"] for r in records].count("done") != 1 or records[-1] != dict(counts, kind="done"):
+                failed.append("{}: done is not last or miscounts {}".format(os.path.basename(filename), counts))
+    return failed
+
+class Unannotate(ast.NodeTransformer):
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
+        node.returns = None
+        for arg in node.args.args:
+            arg.annotation = None
+        self.generic_visit(node)
+        return node
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> ast.Assign:
+        return ast.Assign([node.target], node.value)
+
+def Unannotated(tree: ast.Module) -> list[str]:
+    # Statements of an annotated source without its annotations and prelude
+    statements = []
+    for statement in tree.body:
+        if type(statement) == ast.ImportFrom and statement.module in ("types", "typing"):
+            continue
+        if type(statement) == ast.Assign and type(statement.value) == ast.Call and getattr(statement.value.func, "id", None) == "TypeVar":
+            continue
+        statements.append(ast.dump(Unannotate().visit(statement)))
+    return statements
+
+def Annotations(tree: ast.Module) -> list[ast.expr]:
+    found = []
+    for node in ast.walk(tree):
+        if type(node) == ast.FunctionDef:
+            found.extend(arg.annotation for arg in node.args.args if arg.annotation)
+            if node.returns:
+                found.append(node.returns)
+        elif type(node) == ast.AnnAssign:
+            found.append(node.annotation)
+    return found
+
+def Signatures(tree: ast.Module) -> dict[str, str]:
+    return {node.name: "({}) -> {}".format(ast.unparse(node.args), ast.unparse(node.returns) if node.returns else None) for node in tree.body if type(node) == ast.FunctionDef}
+
+def CheckAnnotate() -> list[str]:
+    # An annotated source is the source with annotations whose names are
+    # all defined, and its stub declares the same function signatures
+    failed = []
+    for filename in Programs():
+        with open(filename, 'rb') as file:
+            source = file.read()
+        tree = ast.parse(source, filename)
+        CheckTree(tree)
+        name = os.path.basename(filename)
+        try:
+            annotated = ast.parse(Annotate(source, tree, TypeVisitor.typedVariables, "py"))
+            stub = ast.parse(Annotate(source, tree, TypeVisitor.typedVariables, "pyi"))
+        except SyntaxError as e:
+            failed.append("{}: {} in line {} of the output".format(name, e.msg, e.lineno))
+            continue
+        for (kind, output) in (("py", annotated), ("pyi", stub)):
+            defined = {n.id for n in output.body if type(n) == ast.Assign for n in n.targets if type(n) == ast.Name}
+            defined.update(a.asname or a.name for n in output.body if type(n) == ast.ImportFrom for a in n.names)
+            used = {n.id for annotation in Annotations(output) for n in ast.walk(annotation) if type(n) == ast.Name}
+            for undefined in sorted(used - defined - set(dir(builtins))):
+                failed.append("{}: the {} uses {} undefined".format(name, kind, undefined))
+        signatures = Signatures(annotated)
+        for (function, signature) in Signatures(stub).items():
+            if signatures.get(function) != signature:
+                failed.append("{}: {} is {} in the py, {} in the pyi".format(name, function, signatures.get(function), signature))
+        if Unannotated(annotated) != [ast.dump(statement) for statement in ast.parse(source).body]:
+            failed.append("{}: the annotated source has other statements".format(name))
+    return failed
+
+CHECKS = [CheckBudget, CheckProfile, CheckStubs, CheckServer, CheckJsonLines, CheckAnnotate]
+
+def Main() -> int:
+    failed = 0
+    for filename in Programs():
+        (expected, reported) = Check(filename)
+        differing = CheckCache(filename) + CheckWorklist(filename) + CheckIncremental(filename)
+        if Rendered(filename, 1) != Rendered(filename, 2):
+            differing.append("different hash seed")
+        if expected == reported and not differing:
+            continue
+        failed += 1
+        print("== {}".format(os.path.basename(filename)))
+        for error in sorted(expected - reported):
+            print("missing  {}".format(error))
+        for error in sorted(reported - expected):
+            print("reported {}".format(error))
+        for run in differing:
+            print("types differ with a {}".format(run))
+    for check in CHECKS:
+        failures = check()
+        if failures:
+            failed += 1
+            print("== {}".format(check.__name__))
+            for failure in failures:
+                print(failure)
+    print("== {} regressions failed".format(failed) if failed else "== No regressions failed")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--types"]:
+        print("\n".join(Types(sys.argv[2])))
+        sys.exit(0)
+    sys.exit(Main())
@@ -0,0 +1,3 @@
+# ord and chr take the base types of their documented arguments
+a = ord("a")
+b = chr(ord("b"))
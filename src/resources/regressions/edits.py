@@ -0,0 +1,19 @@
+# Statements reused after an edit read values and call functions that
+# later statements change or redefine
+x = [1]
+y = x
+z = 2
+w = z + 1
+x.append(2.5)
+def scale(a):
+    return a * z
+v = scale(w)
+u = [w]
+t = u
+def scale(a):
+    return [a]
+s = scale(v)
+k = 1
+def pair(a):
+    return [a, k]
+m = pair(2)
@@ -0,0 +1,12 @@
+# error: (Ln5 Col6) str is not a subtype of float
+# error: (Ln10 Col6) str is not a subtype of float
+# The test of a while loop sees the bindings carried around the loop
+x = 1
+while x < 10:
+    y = x
+    x = "a"
+n = 0
+s = 1
+while n < s:
+    n = n + 1
+    s = "b"
@@ -0,0 +1,11 @@
+# error: (Ln6 Col8) str is not a subtype of float
+# error: (Ln10 Col8) str is not a subtype of float
+# The fixpoint sees changes below the top level of nested containers
+x = [[1]]
+while True:
+    y = x[0][0] + 1
+    x = [["s"]]
+d = {"a": [1]}
+for i in range(3):
+    z = d["a"][0] + 1
+    d = {"a": ["s"]}
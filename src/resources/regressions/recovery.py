@@ -0,0 +1,5 @@
+# error: (Ln4 Col11) str is not a subtype of float
+# A failing return gives the function an error result, calls report nothing new
+def f(x):
+    return x + "q"
+c = f(1) + 1
@@ -0,0 +1,17 @@
+# Functions that change an outer binding are inferred on every run, the
+# others are taken from the signature cache when it is warm
+x = []
+def f(v):
+    x.append(v)
+    return 1
+z = x
+y = [1.5]
+def g(v):
+    y.append(v)
+    return v
+def h(a, b):
+    return f(a) + g(b)
+w = h(2, 2.5)
+def twice(a):
+    return h(a, a) * 2
+t = twice(1.5)
@@ -0,0 +1,68 @@
+# Every member of the stub library is used once, with arguments of its parameter types
+import math
+import random
+import string
+import time
+import statistics
+math_pi = math.pi
+math_e = math.e
+math_tau = math.tau
+math_inf = math.inf
+math_nan = math.nan
+math_sqrt = math.sqrt(1.5)
+math_exp = math.exp(1.5)
+math_log = math.log(1.5)
+math_log2 = math.log2(1.5)
+math_log10 = math.log10(1.5)
+math_sin = math.sin(1.5)
+math_cos = math.cos(1.5)
+math_tan = math.tan(1.5)
+math_asin = math.asin(1.5)
+math_acos = math.acos(1.5)
+math_atan = math.atan(1.5)
+math_atan2 = math.atan2(1.5, 1.5)
+math_hypot = math.hypot(1.5, 1.5)
+math_degrees = math.degrees(1.5)
+math_radians = math.radians(1.5)
+math_fabs = math.fabs(1.5)
+math_fmod = math.fmod(1.5, 1.5)
+math_pow = math.pow(1.5, 1.5)
+math_floor = math.floor(1.5)
+math_ceil = math.ceil(1.5)
+math_trunc = math.trunc(1.5)
+math_isqrt = math.isqrt(2)
+math_factorial = math.factorial(2)
+math_gcd = math.gcd(2, 2)
+math_lcm = math.lcm(2, 2)
+math_comb = math.comb(2, 2)
+math_perm = math.perm(2, 2)
+math_isclose = math.isclose(1.5, 1.5)
+math_isnan = math.isnan(1.5)
+math_isinf = math.isinf(1.5)
+random_random = random.random()
+random_randint = random.randint(2, 2)
+random_randrange = random.randrange(2)
+random_uniform = random.uniform(1.5, 1.5)
+random_gauss = random.gauss(1.5, 1.5)
+random_getrandbits = random.getrandbits(2)
+random_shuffle = random.shuffle([3, 1])
+random_seed = random.seed(0)
+string_ascii_letters = string.ascii_letters
+string_ascii_lowercase = string.ascii_lowercase
+string_ascii_uppercase = string.ascii_uppercase
+string_digits = string.digits
+string_hexdigits = string.hexdigits
+string_octdigits = string.octdigits
+string_punctuation = string.punctuation
+string_printable = string.printable
+string_whitespace = string.whitespace
+string_capwords = string.capwords("a b")
+time_time = time.time()
+time_perf_counter = time.perf_counter()
+time_monotonic = time.monotonic()
+time_sleep = time.sleep(1.5)
+statistics_mean = statistics.mean([1.0, 2.0])
+statistics_fmean = statistics.fmean([1.0, 2.0])
+statistics_median = statistics.median([1.0, 2.0])
+statistics_stdev = statistics.stdev([1.0, 2.0])
+statistics_pstdev = statistics.pstdev([1.0, 2.0])
@@ -0,0 +1,9 @@
+# Unions of many heads are rendered the same under every hash seed
+def select(cond, a, b):
+    if cond:
+        return a
+    return b
+u = select(True, 1, select(False, "s", select(True, 2.5, None)))
+l = [1, "s", 2.5, None, True, [1], {"k": 1}]
+d = {1: "a", "b": 2.5, None: [select]}
+s = select(True, l, d)
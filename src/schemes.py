@@ -0,0 +1,71 @@
+from __future__ import annotations
+from copy import deepcopy
+from automata import BaseType, Head, State
+from serialization import DecodeStates, EncodeStates, EncodedGraph
+from simplification import Simplify
+
+# Call results memoized per scheme at most
+MAX_CALLS = 256
+
+class Scheme:
+    # A generalized function type: a private snapshot of the subgraph that is
+    # reachable from the function state when its definition is finished.
+    # Every call instantiates a fresh copy of the snapshot, so the cost of a
+    # call only depends on the size of this graph. States of outer bindings
+    # are copied as well, functions are frozen at their definition.
+    def __init__(self, root: State):
+        (graph, _) = Simplify(EncodeStates([root]))
+        self.graph   : EncodedGraph = graph
+        # Identifies the definition when its type only depends on its source
+        # and the schemes it calls, see dependencies.py
+        self.signature: str | None = None
+        # Heads of the result per heads of concrete arguments, see CallKey
+        self.calls    : dict[tuple[frozenset[Head], ...], frozenset[Head]] = {}
+
+    @staticmethod
+    def FromGraph(graph: EncodedGraph, signature: str | None = None) -> Scheme:
+        # A scheme stored by its graph, e.g. in the stub library
+        scheme = Scheme.__new__(Scheme)
+        scheme.graph = graph
+        scheme.signature = signature
+        scheme.calls = {}
+        return scheme
+
+    def Size(self) -> int:
+        return len(self.graph[0])
+
+    def Instantiate(self) -> State:
+        return DecodeStates(self.graph)[self.graph[2][0]]
+
+def Instantiate(state: State) -> State:
+    if state.scheme is not None:
+        return state.scheme.Instantiate()
+    return deepcopy(state)
+
+class CallStats:
+    __slots__ = ("hits", "misses", "stored")
+
+    def __init__(self):
+        self.hits  : int = 0
+        self.misses: int = 0
+        self.stored: int = 0
+
+    def __str__(self) -> str:
+        return "hits={} misses={} stored={}".format(self.hits, self.misses, self.stored)
+
+def CallKey(arguments: list[State], inFunction: bool) -> tuple[frozenset[Head], ...] | None:
+    # Arguments with only base types are concrete when unifying them with
+    # the parameters changes nothing but the instance. At the top level
+    # their flows only lead to the result states of earlier calls, which
+    # nothing unifies with again. In a function they may lead to its
+    # parameters, so there they must not flow at all.
+    key: list[frozenset[Head]] = []
+    for argument in arguments:
+        if inFunction and argument.flows:
+            return None
+        heads = frozenset(argument.heads)
+        for h in heads:
+            if type(h) != BaseType:
+                return None
+        key.append(heads)
+    return tuple(key)
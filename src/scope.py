@@ -1,8 +1,11 @@
 from __future__ import annotations
 from ast import stmt, expr, arg 
+from typing import KeysView
 from automata import State
 
 class Variable:
+    __slots__ = ("name", "node", "state")
+
     def __init__(self, name : str, node : stmt | expr | arg, state : State):
         self.name    : str = name
         self.node    : stmt | expr | arg = node
@@ -12,29 +15,38 @@ class Variable:
         return "(Ln{} Col{}) type({})={}".format(self.node.lineno, self.node.col_offset, self.name, self.state)
 
 class Scope:
-    def __init__(self):
-        self.mapping : list[tuple[str, Variable]] = []
+    __slots__ = ("parent", "bindings", "mapping")
+
+    def __init__(self, parent : Scope | None = None):
+        self.parent   : Scope | None = parent
+        # Latest binding per name in this frame, and every binding in order
+        self.bindings : dict[str, Variable] = {}
+        self.mapping  : list[tuple[str, Variable]] = []
 
     def Add(self, name : str, var : Variable):
+        self.bindings[name] = var
         self.mapping.append((name , var))
 
+    def Find(self, name) -> Variable | None:
+        scope : Scope | None = self
+        while scope is not None:
+            var = scope.bindings.get(name)
+            if var is not None:
+                return var
+            scope = scope.parent
+        return None
+
     def Get(self, name) -> Variable:
-        for m in self.mapping[::-1]:
-            if m[0] == name:
-                return m[1]
-        raise Exception("Name not bound in scope: " + name)
+        var = self.Find(name)
+        if var is None:
+            raise Exception("Name not bound in scope: " + name)
+        return var
 
     def Contains(self, name):
-        for m in self.mapping[::-1]:
-            if m[0] == name:
-                return True
-        return False
+        return self.Find(name) is not None
 
-    def GetBoundNames(self) -> set[str]:
-        result : set[str] = set()
-        for (name, var) in self.mapping:
-            result.add(name)
-        return result
+    def GetBoundNames(self) -> KeysView[str]:
+        return self.bindings.keys()
 
     def __str__(self) -> str:
         result = ""
@@ -44,7 +56,8 @@ class Scope:
 
     @staticmethod
     def CombineScopes(scope1 : Scope, scope2 : Scope):
-        combination = Scope()
-        combination.mapping.extend(scope1.mapping)
-        combination.mapping.extend(scope2.mapping)
-        return combination
\ No newline at end of file
+        # Overlay frame: shares the bindings of scope2 and falls back to scope1
+        combination = Scope(scope1)
+        combination.bindings = scope2.bindings
+        combination.mapping = scope2.mapping
+        return combination
@@ -0,0 +1,183 @@
+from __future__ import annotations
+import ast
+import marshal
+from hashlib import blake2b
+from automata import BaseType, DictHead, ErrorType, Function, Head, IterHead, ListHead, Record, SetHead, State, TypeVariable
+from scope import Variable
+
+# Encoded heads are tuples starting with one of these tags
+BASE, VARIABLE, FUNCTION, RECORD, ERROR = 0, 1, 2, 3, 4
+
+recordClasses: dict[str, type[Record]] = {
+    cls.__name__: cls for cls in (Record, IterHead, DictHead, ListHead, SetHead)
+}
+
+# An encoded graph is a tuple (states, heads, roots):
+#   states: (polarity, flow indices, head indices) per state
+#   heads : encoded heads, children refer to state indices
+#   roots : state indices of the requested roots
+# Heads are stored separately so heads shared between states stay shared.
+EncodedGraph = tuple[list[tuple[bool, tuple[int, ...], tuple[int, ...]]], list[tuple], list[int]]
+
+def EncodeStates(roots: list[State], structural: bool = False) -> EncodedGraph:
+    # A structural encoding only follows heads and keeps the flow edges
+    # between the states found that way.
+    stateIndex: dict[int, int] = {}
+    headIndex : dict[int, int] = {}
+    order     : list[State] = []
+    heads     : list[Head] = []
+
+    def StateRef(state: State) -> int:
+        index = stateIndex.get(id(state))
+        if index is None:
+            index = len(order)
+            stateIndex[id(state)] = index
+            order.append(state)
+        return index
+
+    rootIndices = [StateRef(r) for r in roots]
+    encodedStates: list[tuple[bool, tuple[int, ...], tuple[int, ...]]] = []
+    encodedHeads : list[tuple] = []
+    i = 0
+    while i < len(order):
+        state = order[i]
+        flows = () if structural else tuple(StateRef(f) for f in state.flows)
+        headRefs: list[int] = []
+        for h in state.heads:
+            index = headIndex.get(id(h))
+            if index is None:
+                index = len(heads)
+                headIndex[id(h)] = index
+                heads.append(h)
+                encodedHeads.append(())
+                encodedHeads[index] = EncodeHead(h, StateRef)
+            headRefs.append(index)
+        encodedStates.append((state.polarity, flows, tuple(headRefs)))
+        i += 1
+    if structural:
+        for (i, state) in enumerate(order):
+            flows = tuple(stateIndex[id(f)] for f in state.flows if id(f) in stateIndex)
+            encodedStates[i] = (state.polarity, flows, encodedStates[i][2])
+    return (encodedStates, encodedHeads, rootIndices)
+
+def EncodeHead(h: Head, StateRef) -> tuple:
+    if type(h) == BaseType:
+        return (BASE, h.name) #type: ignore
+    if type(h) == TypeVariable:
+        return (VARIABLE, h.paramName) #type: ignore
+    if type(h) == Function:
+        return (FUNCTION, tuple(StateRef(p) for p in h.parameters), StateRef(h.result)) #type: ignore
+    if isinstance(h, Record):
+        fields = tuple((key, StateRef(value)) for (key, value) in h.fields.items())
+        return (RECORD, type(h).__name__, fields)
+    if type(h) == ErrorType:
+        return (ERROR,)
+    raise Exception("Cannot encode head {}".format(h))
+
+def DecodeStates(graph: EncodedGraph) -> list[State]:
+    (encodedStates, encodedHeads, _) = graph
+    states = [State(polarity) for (polarity, _, _) in encodedStates]
+    heads : list[Head] = []
+    for encoded in encodedHeads:
+        tag = encoded[0]
+        if tag == BASE:
+            heads.append(BaseType(encoded[1]))
+        elif tag == VARIABLE:
+            heads.append(TypeVariable(encoded[1]))
+        elif tag == FUNCTION:
+            function = Function()
+            function.parameters = [states[i] for i in encoded[1]]
+            function.result = states[encoded[2]]
+            heads.append(function)
+        elif tag == ERROR:
+            heads.append(ErrorType())
+        else:
+            cls = recordClasses[encoded[1]]
+            record = cls.__new__(cls)
+            record.fields = {key: states[i] for (key, i) in encoded[2]}
+            heads.append(record)
+
+    for (state, (_, flows, headRefs)) in zip(states, encodedStates):
+        state.flows = {states[i] for i in flows}
+        state.heads = {heads[i] for i in headRefs}
+    return states
+
+def Dumps(graph: EncodedGraph) -> bytes:
+    return marshal.dumps(graph)
+
+def Loads(data: bytes) -> EncodedGraph:
+    return marshal.loads(data)
+
+def DumpVariables(variables: list[Variable], tree: ast.AST) -> bytes | None:
+    # Nodes are stored by their position in ast.walk(tree), so the variables
+    # can be rebound to any structurally identical tree.
+    nodeIndex = {id(n): i for (i, n) in enumerate(ast.walk(tree))}
+    entries: list[tuple[str, int]] = []
+    for var in variables:
+        if id(var.node) not in nodeIndex:
+            return None
+        entries.append((var.name, nodeIndex[id(var.node)]))
+    graph = EncodeStates([var.state for var in variables], structural=True)
+    return marshal.dumps((graph, entries))
+
+def LoadVariables(data: bytes, tree: ast.AST) -> list[Variable]:
+    (graph, entries) = marshal.loads(data)
+    if not entries or len(entries) != len(graph[2]):
+        raise ValueError("Variables do not match their states")
+    states = DecodeStates(graph)
+    nodes = list(ast.walk(tree))
+    return [Variable(name, nodes[n], states[r]) for ((name, n), r) in zip(entries, graph[2])]
+
+def Fingerprint(roots: list[State]) -> str:
+    # Set iteration order differs between runs, so the encoding itself is not
+    # canonical. Colour refinement over the labelled graph gives a stable hash
+    # that only depends on the shape of the automaton.
+    (encodedStates, encodedHeads, rootIndices) = EncodeStates(roots, structural=True)
+    edges: list[list[tuple[str, int]]] = [[] for _ in encodedStates]
+    colours: list[str] = []
+    for (i, (polarity, flows, headRefs)) in enumerate(encodedStates):
+        labels: list[str] = []
+        for f in flows:
+            edges[i].append(("~", f))
+        for h in headRefs:
+            encoded = encodedHeads[h]
+            if encoded[0] == FUNCTION:
+                label = "f{}".format(len(encoded[1]))
+                for (n, p) in enumerate(encoded[1]):
+                    edges[i].append(("{}.{}".format(label, n), p))
+                edges[i].append(("{}.r".format(label), encoded[2]))
+            elif encoded[0] == RECORD:
+                label = "{}({})".format(encoded[1], ",".join(sorted(k for (k, _) in encoded[2])))
+                for (key, value) in encoded[2]:
+                    edges[i].append(("{}.{}".format(label, key), value))
+            else:
+                label = "{}:{}".format(encoded[0], encoded[1])
+            labels.append(label)
+        colours.append("{}[{}]".format("+" if polarity else "-", "|".join(sorted(labels))))
+    for r in rootIndices:
+        colours[r] = "root{}:{}".format(rootIndices.index(r), colours[r])
+
+    reverse: list[list[tuple[str, int]]] = [[] for _ in encodedStates]
+    for (i, out) in enumerate(edges):
+        for (label, j) in out:
+            reverse[j].append((label, i))
+
+    distinct = len(set(colours))
+    for _ in range(len(colours)):
+        refined: list[str] = []
+        for i in range(len(colours)):
+            outgoing = sorted("{}>{}".format(l, colours[j]) for (l, j) in edges[i])
+            incoming = sorted("{}<{}".format(l, colours[j]) for (l, j) in reverse[i])
+            signature = "{};{};{}".format(colours[i], ",".join(outgoing), ",".join(incoming))
+            refined.append(blake2b(signature.encode(), digest_size=8).hexdigest())
+        colours = refined
+        if len(set(colours)) == distinct:
+            break
+        distinct = len(set(colours))
+
+    digest = blake2b(digest_size=16)
+    for colour in sorted(colours):
+        digest.update(colour.encode())
+    for r in rootIndices:
+        digest.update(colours[r].encode())
+    return digest.hexdigest()
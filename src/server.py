@@ -0,0 +1,171 @@
+import gc
+import json
+import sys
+import traceback
+from argparse import ArgumentParser
+from typing import BinaryIO
+from exceptions import ToolError
+from incremental import Document
+from pretty_printing import FormatType
+from signature_cache import SignatureCache
+from type_visitors import TypeVisitor
+
+# Language server over stdio. Builtins stay loaded between requests and
+# every open file keeps its Document, so an edit only re-infers the
+# statements from the first changed one. Only full document sync is
+# offered: every change notification carries the whole text.
+
+PARSE_ERROR      = -32700
+INVALID_REQUEST  = -32600
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR   = -32603
+
+def ReadMessage(stream: BinaryIO) -> dict | None:
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        (name, _, value) = line.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return {}
+    return json.loads(stream.read(length))
+
+def WriteMessage(stream: BinaryIO, message: dict):
+    body = json.dumps(message).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body))
+    stream.write(body)
+    stream.flush()
+
+def ToColumn(line: str, character: int) -> int:
+    # LSP counts UTF-16 code units, the AST counts UTF-8 bytes
+    units = line.encode("utf-16-le")[:2 * character]
+    return len(units.decode("utf-16-le", errors="ignore").encode("utf-8"))
+
+def ToCharacter(line: str, column: int) -> int:
+    prefix = line.encode("utf-8")[:column].decode("utf-8", errors="ignore")
+    return len(prefix.encode("utf-16-le")) // 2
+
+class Server:
+    def __init__(self, output: BinaryIO):
+        self.output    : BinaryIO = output
+        self.documents : dict[str, Document] = {}
+        self.shutdown  : bool = False
+
+    def Send(self, message: dict):
+        message["jsonrpc"] = "2.0"
+        WriteMessage(self.output, message)
+
+    def Diagnose(self, uri: str, lines: list[str], errors: list[tuple[int, int, str]]):
+        # errors are (line, column, message) with positions as in the AST
+        diagnostics = []
+        for (line, column, message) in errors:
+            text = lines[line - 1] if 0 < line <= len(lines) else ""
+            start = {"line": max(line - 1, 0), "character": ToCharacter(text, column)}
+            end = {"line": start["line"], "character": max(len(text.encode("utf-16-le")) // 2, start["character"])}
+            diagnostics.append({"range": {"start": start, "end": end}, "severity": 1, "source": "typhon", "message": message})
+        self.Send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": diagnostics}})
+
+    def Check(self, uri: str, text: str):
+        document = self.documents.setdefault(uri, Document())
+        try:
+            document.Check(text)
+        except SyntaxError as e:
+            self.Diagnose(uri, text.splitlines(), [(e.lineno or 1, max((e.offset or 1) - 1, 0), e.msg)])
+            return
+        errors = []
+        if isinstance(document.error, ToolError):
+            errors.append((document.error.node.lineno, document.error.node.col_offset, document.error.message))
+        elif document.error is not None and document.errorNode is not None:
+            errors.append((document.errorNode.lineno, document.errorNode.col_offset, str(document.error))) #type: ignore
+        self.Diagnose(uri, document.lines, errors)
+        # The automaton is full of cycles. Collecting them while a check
+        # allocates costs more than the check itself on large files, so the
+        # previous version's states are collected once the answer is out.
+        gc.collect()
+
+    def Hover(self, params: dict) -> dict | None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return None
+        line = params["position"]["line"]
+        if line >= len(document.lines):
+            return None
+        column = ToColumn(document.lines[line], params["position"]["character"])
+        var = document.index.Find(line + 1, column)
+        if var is None:
+            return None
+        text = "{}: {}".format(var.name, FormatType(var.state))
+        return {"contents": {"kind": "markdown", "value": "```python\n{}\n```".format(text)}}
+
+    def Handle(self, message: dict):
+        method = message.get("method")
+        params = message.get("params") or {}
+        if "id" not in message:
+            if method == "textDocument/didOpen":
+                self.Check(params["textDocument"]["uri"], params["textDocument"]["text"])
+            elif method == "textDocument/didChange":
+                self.Check(params["textDocument"]["uri"], params["contentChanges"][-1]["text"])
+            elif method == "textDocument/didClose":
+                uri = params["textDocument"]["uri"]
+                self.documents.pop(uri, None)
+                self.Send({"method": "textDocument/publishDiagnostics", "params": {"uri": uri, "diagnostics": []}})
+            elif method == "exit":
+                sys.exit(0 if self.shutdown else 1)
+            return
+
+        if method == "initialize":
+            result = {
+                "capabilities": {"textDocumentSync": 1, "hoverProvider": True},
+                "serverInfo": {"name": "typhon"},
+            }
+        elif method == "textDocument/hover":
+            result = self.Hover(params)
+        elif method == "shutdown":
+            self.shutdown = True
+            result = None
+        else:
+            self.Send({"id": message["id"], "error": {"code": METHOD_NOT_FOUND, "message": "Unknown method: {}".format(method)}})
+            return
+        self.Send({"id": message["id"], "result": result})
+
+    def Dispatch(self, message: dict):
+        # A failing request is answered with an error and a failing
+        # notification is logged and dropped, the server keeps running
+        try:
+            self.Handle(message)
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            if isinstance(message, dict) and "id" in message:
+                self.Send({"id": message["id"], "error": {"code": INTERNAL_ERROR, "message": "{}: {}".format(type(e).__name__, e)}})
+
+    def Run(self, input: BinaryIO):
+        gc.disable()
+        while True:
+            try:
+                message = ReadMessage(input)
+            except ValueError as e:
+                self.Send({"id": None, "error": {"code": PARSE_ERROR, "message": str(e)}})
+                continue
+            if message is None:
+                break
+            if not message:
+                self.Send({"id": None, "error": {"code": INVALID_REQUEST, "message": "Missing Content-Length"}})
+                continue
+            self.Dispatch(message)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Typhon language server over stdio",
+                            epilog="TYPHON_STATES=arena stores the automata in compact arrays, which trades time for memory: "
+                                   "about half the memory, about twice the time.")
+    parser.add_argument("--cache-dir", default=None, help="directory of the persistent function signature cache")
+    parser.add_argument("--cache-size", type=int, default=64, help="maximum size of the signature cache in MB")
+    args = parser.parse_args()
+    if args.cache_dir:
+        TypeVisitor.signatureCache = SignatureCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    Server(sys.stdout.buffer).Run(sys.stdin.buffer)
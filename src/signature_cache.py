@@ -0,0 +1,107 @@
+import os
+from hashlib import sha256
+
+# Bump whenever inference results for the same source can change.
+CACHE_VERSION = "4"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class SignatureCache:
+    def __init__(self, directory: str, maxBytes: int = DEFAULT_MAX_BYTES):
+        self.directory: str = directory
+        self.maxBytes : int = maxBytes
+        self.hits     : int = 0
+        self.misses   : int = 0
+        self.stores   : int = 0
+        self.evictions: int = 0
+        os.makedirs(directory, exist_ok=True)
+        self.totalBytes: int = sum(size for (_, _, size) in self.Entries())
+
+    @staticmethod
+    def Key(parts: list[str]) -> str:
+        digest = sha256(CACHE_VERSION.encode())
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part.encode())
+        return digest.hexdigest()
+
+    def Path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".sig")
+
+    def Entries(self) -> list[tuple[float, str, int]]:
+        entries: list[tuple[float, str, int]] = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".sig"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def Get(self, key: str) -> bytes | None:
+        path = self.Path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            # The modification time doubles as the LRU access time
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def Discard(self, key: str):
+        # An entry that could not be decoded counts as a miss
+        self.hits -= 1
+        self.misses += 1
+        path = self.Path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        self.totalBytes -= size
+        self.evictions += 1
+
+    def Put(self, key: str, data: bytes):
+        path = self.Path(key)
+        tmpPath = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(tmpPath, 'wb') as file:
+                file.write(data)
+            os.replace(tmpPath, path)
+        except OSError:
+            return
+        self.stores += 1
+        self.totalBytes += len(data)
+        if self.totalBytes > self.maxBytes:
+            self.Evict()
+
+    def Evict(self):
+        # Other processes may share the directory, so recount before evicting.
+        entries = sorted(self.Entries())
+        self.totalBytes = sum(size for (_, _, size) in entries)
+        target = self.maxBytes * 3 // 4
+        for (_, path, size) in entries:
+            if self.totalBytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.totalBytes -= size
+            self.evictions += 1
+
+    def Stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bytes": self.totalBytes
+        }
+
+    def __str__(self) -> str:
+        return "hits={hits} misses={misses} stores={stores} evictions={evictions} bytes={bytes}".format(**self.Stats())
@@ -0,0 +1,239 @@
+from __future__ import annotations
+from automata import Function, Record, State
+from serialization import FUNCTION, RECORD, EncodedGraph
+
+class PassStats:
+    def __init__(self, name: str, statesBefore: int, edgesBefore: int, statesAfter: int, edgesAfter: int):
+        self.name        : str = name
+        self.statesBefore: int = statesBefore
+        self.edgesBefore : int = edgesBefore
+        self.statesAfter : int = statesAfter
+        self.edgesAfter  : int = edgesAfter
+
+    def __str__(self) -> str:
+        return "{:<12} states {:>6} -> {:<6} edges {:>6} -> {:<6}".format(
+            self.name, self.statesBefore, self.statesAfter, self.edgesBefore, self.edgesAfter)
+
+class SimplificationReport:
+    def __init__(self):
+        self.passes: dict[str, PassStats] = {}
+
+    def Add(self, stats: PassStats):
+        total = self.passes.get(stats.name)
+        if total is None:
+            self.passes[stats.name] = PassStats(stats.name, 0, 0, 0, 0)
+            total = self.passes[stats.name]
+        total.statesBefore += stats.statesBefore
+        total.edgesBefore  += stats.edgesBefore
+        total.statesAfter  += stats.statesAfter
+        total.edgesAfter   += stats.edgesAfter
+
+    def __str__(self) -> str:
+        return "\n".join(str(p) for p in self.passes.values())
+
+# Collects the counts of every simplification when set
+report: SimplificationReport | None = None
+
+def Children(head: tuple) -> list[int]:
+    if head[0] == FUNCTION:
+        return [*head[1], head[2]]
+    if head[0] == RECORD:
+        return [i for (_, i) in head[2]]
+    return []
+
+def CountEdges(graph: EncodedGraph) -> int:
+    (states, heads, _) = graph
+    edges = 0
+    for (_, flows, headRefs) in states:
+        edges += len(flows)
+        for h in headRefs:
+            edges += len(Children(heads[h]))
+    return edges
+
+def Rebuild(graph: EncodedGraph, mapping: list[int], size: int) -> EncodedGraph:
+    # mapping[i] is the new index of state i, or -1 when the state is dropped.
+    # Merged states take the union of their flows and heads.
+    (states, heads, roots) = graph
+    newFlows: list[set[int]] = [set() for _ in range(size)]
+    newHeads: list[set[int]] = [set() for _ in range(size)]
+    polarity: list[bool] = [True] * size
+    headIndex: dict[tuple, int] = {}
+    encodedHeads: list[tuple] = []
+    for (i, (p, flows, headRefs)) in enumerate(states):
+        target = mapping[i]
+        if target < 0:
+            continue
+        polarity[target] = p
+        newFlows[target].update(mapping[f] for f in flows if mapping[f] >= 0)
+        for h in headRefs:
+            encoded = RemapHead(heads[h], mapping)
+            index = headIndex.get(encoded)
+            if index is None:
+                index = len(encodedHeads)
+                headIndex[encoded] = index
+                encodedHeads.append(encoded)
+            newHeads[target].add(index)
+    encodedStates = [(polarity[i], tuple(sorted(newFlows[i])), tuple(sorted(newHeads[i]))) for i in range(size)]
+    return (encodedStates, encodedHeads, [mapping[r] for r in roots])
+
+def RemapHead(head: tuple, mapping: list[int]) -> tuple:
+    if head[0] == FUNCTION:
+        return (FUNCTION, tuple(mapping[p] for p in head[1]), mapping[head[2]])
+    if head[0] == RECORD:
+        return (RECORD, head[1], tuple((key, mapping[i]) for (key, i) in head[2]))
+    return head
+
+def RemoveUnreachable(graph: EncodedGraph) -> tuple[EncodedGraph, list[int]]:
+    # States that are only reachable over flow edges are never read again:
+    # Biunify only merges into them. Dropping them also drops those edges.
+    (states, heads, roots) = graph
+    mapping = [-1] * len(states)
+    order: list[int] = []
+    for r in roots:
+        if mapping[r] < 0:
+            mapping[r] = len(order)
+            order.append(r)
+    i = 0
+    while i < len(order):
+        for h in states[order[i]][2]:
+            for child in Children(heads[h]):
+                if mapping[child] < 0:
+                    mapping[child] = len(order)
+                    order.append(child)
+        i += 1
+    return (Rebuild(graph, mapping, len(order)), mapping)
+
+def Minimize(graph: EncodedGraph) -> tuple[EncodedGraph, list[int]]:
+    # Partition refinement of the states by polarity, heads and the blocks
+    # of their children. States on flow edges stand for type variables and
+    # keep their own block, merging them would unify distinct variables.
+    (states, heads, roots) = graph
+    flowing: set[int] = set()
+    for (i, (_, flows, _)) in enumerate(states):
+        if flows:
+            flowing.add(i)
+            flowing.update(flows)
+
+    def Label(head: tuple) -> tuple:
+        if head[0] == FUNCTION:
+            return (FUNCTION, len(head[1]))
+        if head[0] == RECORD:
+            return (RECORD, head[1], tuple(sorted(k for (k, _) in head[2])))
+        return head
+
+    block: list[int] = []
+    initial: dict[tuple, int] = {}
+    for (i, (p, _, headRefs)) in enumerate(states):
+        key = ("flow", i) if i in flowing else (p, tuple(sorted(Label(heads[h]) for h in headRefs)))
+        block.append(initial.setdefault(key, len(initial)))
+    members: list[set[int]] = [set() for _ in initial]
+    for (i, b) in enumerate(block):
+        members[b].add(i)
+
+    predecessors: list[set[int]] = [set() for _ in states]
+    for (i, (_, _, headRefs)) in enumerate(states):
+        for h in headRefs:
+            for child in Children(heads[h]):
+                predecessors[child].add(i)
+
+    def Signature(i: int) -> tuple:
+        signature = []
+        for h in states[i][2]:
+            head = heads[h]
+            if head[0] == FUNCTION:
+                signature.append((FUNCTION, tuple(block[p] for p in head[1]), block[head[2]]))
+            elif head[0] == RECORD:
+                signature.append((RECORD, head[1], tuple(sorted((k, block[c]) for (k, c) in head[2]))))
+            else:
+                signature.append(head)
+        return tuple(sorted(set(signature)))
+
+    # Blocks with the states whose signature may have changed since the
+    # block was last split, None when every member has to be compared.
+    # The other members still share one signature, so only the changed
+    # states are compared against one of them and moved out when they
+    # differ. Only moved states change the signature of their predecessors.
+    pending: dict[int, set[int] | None] = {b: None for b in range(len(members)) if len(members[b]) > 1}
+    while pending:
+        (b, changed) = pending.popitem()
+        group = members[b]
+        if changed is None:
+            groups: dict[tuple, list[int]] = {}
+            for i in group:
+                groups.setdefault(Signature(i), []).append(i)
+            parts = sorted(groups.values(), key=len, reverse=True)[1:]
+        else:
+            candidates = [i for i in changed if block[i] == b]
+            rest = next((i for i in group if i not in changed), None) if len(candidates) < len(group) else None
+            groups = {} if rest is None else {Signature(rest): []}
+            for i in candidates:
+                groups.setdefault(Signature(i), []).append(i)
+            parts = list(groups.values())
+            if rest is None:
+                parts.sort(key=len, reverse=True)
+            parts = [part for part in parts[1:] if part]
+        if not parts:
+            continue
+        touched: set[int] = set()
+        for part in parts:
+            newBlock = len(members)
+            members.append(set(part))
+            group.difference_update(part)
+            for i in part:
+                block[i] = newBlock
+                touched.update(predecessors[i])
+        for p in touched:
+            b = block[p]
+            if len(members[b]) > 1:
+                if b not in pending:
+                    pending[b] = set()
+                if pending[b] is not None:
+                    pending[b].add(p) #type: ignore
+
+    return (Rebuild(graph, block, len(members)), block)
+
+def Simplify(graph: EncodedGraph) -> tuple[EncodedGraph, list[int]]:
+    # Returns the simplified graph and the new index of every original state
+    mapping = list(range(len(graph[0])))
+    for (name, Pass) in (("reachable", RemoveUnreachable), ("minimize", Minimize)):
+        before = (len(graph[0]), CountEdges(graph))
+        (graph, step) = Pass(graph)
+        mapping = [step[m] if m >= 0 else -1 for m in mapping]
+        if report is not None:
+            report.Add(PassStats(name, before[0], before[1], len(graph[0]), CountEdges(graph)))
+    return (graph, mapping)
+
+def PruneFlows(roots: list[State]) -> PassStats:
+    # Live counterpart of RemoveUnreachable: flow edges into states that no
+    # live binding reaches through its heads are dropped, which also lets
+    # those states be garbage collected.
+    structural: set[int] = set()
+    states: list[State] = []
+    stack = list(roots)
+    while stack:
+        q = stack.pop()
+        if id(q) in structural:
+            continue
+        structural.add(id(q))
+        states.append(q)
+        for h in q.heads:
+            if type(h) == Function:
+                stack.extend(h.parameters) #type: ignore
+                stack.append(h.result) #type: ignore
+            elif isinstance(h, Record):
+                stack.extend(h.fields.values())
+
+    edgesBefore = 0
+    edgesAfter = 0
+    sinks: set[int] = set()
+    for q in states:
+        edgesBefore += len(q.flows)
+        dead = [f for f in q.flows if id(f) not in structural]
+        if dead:
+            sinks.update(id(f) for f in dead)
+            q.flows.difference_update(dead)
+        edgesAfter += len(q.flows)
+    stats = PassStats("live flows", len(states) + len(sinks), edgesBefore, len(states), edgesAfter)
+    if report is not None:
+        report.Add(stats)
+    return stats
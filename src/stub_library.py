@@ -0,0 +1,78 @@
+### Stubs of standard library modules: ###
+# Members are written like the builtins in builtIns.py, "parameters ->
+# result" for functions and a single type for values. The checker reads
+# the compiled library, see stubs.py, this table is only read to compile it.
+stubTable : dict[str, dict[str, str]] = {
+    "math": {
+        "pi"       : "float",
+        "e"        : "float",
+        "tau"      : "float",
+        "inf"      : "float",
+        "nan"      : "float",
+        "sqrt"     : "float -> float",
+        "exp"      : "float -> float",
+        "log"      : "float -> float",
+        "log2"     : "float -> float",
+        "log10"    : "float -> float",
+        "sin"      : "float -> float",
+        "cos"      : "float -> float",
+        "tan"      : "float -> float",
+        "asin"     : "float -> float",
+        "acos"     : "float -> float",
+        "atan"     : "float -> float",
+        "atan2"    : "float, float -> float",
+        "hypot"    : "float, float -> float",
+        "degrees"  : "float -> float",
+        "radians"  : "float -> float",
+        "fabs"     : "float -> float",
+        "fmod"     : "float, float -> float",
+        "pow"      : "float, float -> float",
+        "floor"    : "float -> int",
+        "ceil"     : "float -> int",
+        "trunc"    : "float -> int",
+        "isqrt"    : "int -> int",
+        "factorial": "int -> int",
+        "gcd"      : "int, int -> int",
+        "lcm"      : "int, int -> int",
+        "comb"     : "int, int -> int",
+        "perm"     : "int, int -> int",
+        "isclose"  : "float, float -> bool",
+        "isnan"    : "float -> bool",
+        "isinf"    : "float -> bool",
+    },
+    "random": {
+        "random"     : "-> float",
+        "randint"    : "int, int -> int",
+        "randrange"  : "int -> int",
+        "uniform"    : "float, float -> float",
+        "gauss"      : "float, float -> float",
+        "getrandbits": "int -> int",
+        "shuffle"    : "list -> none",
+        "seed"       : "any -> none",
+    },
+    "string": {
+        "ascii_letters"  : "str",
+        "ascii_lowercase": "str",
+        "ascii_uppercase": "str",
+        "digits"         : "str",
+        "hexdigits"      : "str",
+        "octdigits"      : "str",
+        "punctuation"    : "str",
+        "printable"      : "str",
+        "whitespace"     : "str",
+        "capwords"       : "str -> str",
+    },
+    "time": {
+        "time"        : "-> float",
+        "perf_counter": "-> float",
+        "monotonic"   : "-> float",
+        "sleep"       : "float -> none",
+    },
+    "statistics": {
+        "mean"  : "iter -> float",
+        "fmean" : "iter -> float",
+        "median": "iter -> float",
+        "stdev" : "iter -> float",
+        "pstdev": "iter -> float",
+    },
+}
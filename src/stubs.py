@@ -0,0 +1,153 @@
+from __future__ import annotations
+import marshal
+import mmap
+import os
+import struct
+import sys
+from hashlib import blake2b
+from automata import BaseType, BaseTypeHierarchy, State
+from builtIns import CompileSignature
+from schemes import Scheme
+from serialization import EncodedGraph
+
+# The stub library of stub_library.py is compiled ahead of time into one
+# file: a header, an index of the modules, and per module the scheme graphs
+# of its members, marshalled separately. The file is memory-mapped by the
+# first import that is checked and a module is only decoded when a file
+# imports it, so neither startup nor an import pays for the other modules.
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_PATH = os.path.join(SOURCE_DIRECTORY, "resources", "stubs.bin")
+# The stubs and the signature compiler, the file is rebuilt when they change
+SOURCE_PATHS = [os.path.join(SOURCE_DIRECTORY, name) for name in ("stub_library.py", "builtIns.py")]
+# Bump when a change to schemes, simplification or the graph encoding
+# changes the compiled stubs, then run "python stubs.py"
+STUB_FORMAT_VERSION = "3"
+# Bump when the layout of the file changes
+MAGIC        = b"TYPHONSTUBS2"
+# MAGIC and the length of the index that follows it. The index is
+# (digest of the sources, {module: (offset, length)}), offsets count from
+# the end of the index.
+HEADER       = struct.Struct("<12sI")
+
+# Names bound by "import" have a base type of their own, it has no
+# supertypes and no other type is a subtype of it
+BaseTypeHierarchy.Register("module")
+
+def SourceDigest() -> str:
+    # Empty when only the compiled library is installed
+    digest = blake2b(STUB_FORMAT_VERSION.encode(), digest_size=16)
+    try:
+        for path in SOURCE_PATHS:
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+    except OSError:
+        return ""
+    return digest.hexdigest()
+
+def Compile() -> bytes:
+    from stub_library import stubTable
+    index: dict[str, tuple[int, int]] = {}
+    payloads: list[bytes] = []
+    offset = 0
+    for (module, members) in stubTable.items():
+        graphs = {name: Scheme(CompileSignature(signature)).graph for (name, signature) in members.items()}
+        payload = marshal.dumps(graphs)
+        index[module] = (offset, len(payload))
+        payloads.append(payload)
+        offset += len(payload)
+    encodedIndex = marshal.dumps((SourceDigest(), index))
+    return HEADER.pack(MAGIC, len(encodedIndex)) + encodedIndex + b"".join(payloads)
+
+class StubModule:
+    __slots__ = ("name", "graphs", "signature", "schemes")
+
+    def __init__(self, name: str, graphs: dict[str, EncodedGraph], digest: str):
+        self.name     : str = name
+        self.graphs   : dict[str, EncodedGraph] = graphs
+        # Identifies the stubs for the signature cache and incremental checks
+        self.signature: str = "{}:{}".format(name, digest)
+        self.schemes  : dict[str, Scheme] = {}
+
+    def Members(self) -> list[str]:
+        return list(self.graphs)
+
+    def Member(self, name: str) -> Scheme | None:
+        scheme = self.schemes.get(name)
+        if scheme is None and name in self.graphs:
+            scheme = Scheme.FromGraph(self.graphs[name], "{}.{}".format(self.signature, name))
+            self.schemes[name] = scheme
+        return scheme
+
+    def State(self) -> State:
+        # Value of a name bound by "import", its members are looked up in
+        # the module instead of the state
+        state = State(True)
+        state.heads.add(BaseType("module"))
+        state.scheme = Scheme(state)
+        state.scheme.signature = self.signature
+        return state
+
+class StubLibrary:
+    def __init__(self, data: bytes | mmap.mmap):
+        (magic, indexLength) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a stub library")
+        (digest, index) = marshal.loads(data[HEADER.size:HEADER.size + indexLength])
+        self.data   : bytes | mmap.mmap = data
+        self.digest : str = digest
+        self.index  : dict[str, tuple[int, int]] = index
+        self.base   : int = HEADER.size + indexLength
+        self.modules: dict[str, StubModule] = {}
+        self.loadedBytes: int = 0
+
+    def Module(self, name: str) -> StubModule | None:
+        module = self.modules.get(name)
+        if module is None and name in self.index:
+            (offset, length) = self.index[name]
+            start = self.base + offset
+            module = StubModule(name, marshal.loads(self.data[start:start + length]), self.digest)
+            self.modules[name] = module
+            self.loadedBytes += length
+        return module
+
+    def Stats(self) -> dict[str, int]:
+        return {
+            "modules": len(self.index),
+            "loaded": len(self.modules),
+            "bytes": len(self.data),
+            "loadedBytes": self.loadedBytes
+        }
+
+    def __str__(self) -> str:
+        return "loaded={loaded}/{modules} modules, {loadedBytes} of {bytes} bytes".format(**self.Stats())
+
+def OpenLibrary(path: str = LIBRARY_PATH) -> StubLibrary:
+    # A missing library or one compiled from other sources is compiled again
+    # in memory with a warning, "python stubs.py" writes it
+    digest = SourceDigest()
+    try:
+        with open(path, 'rb') as file:
+            library = StubLibrary(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        if not digest or library.digest == digest:
+            return library
+        problem = "compiled from other stubs"
+    except (OSError, ValueError, EOFError, struct.error) as e:
+        problem = "unreadable ({})".format(e)
+    print("warning: {} is {}, compiling the stubs in memory, run python stubs.py".format(path, problem), file=sys.stderr)
+    return StubLibrary(Compile())
+
+# Opened by the first import, shared by every file checked in this process
+library: StubLibrary | None = None
+
+def Library() -> StubLibrary:
+    global library
+    if library is None:
+        library = OpenLibrary()
+    return library
+
+if __name__ == "__main__":
+    data = Compile()
+    with open(LIBRARY_PATH, 'wb') as file:
+        file.write(data)
+    print("{}: {}".format(LIBRARY_PATH, StubLibrary(data)))
@@ -1,21 +1,50 @@
 import ast
-from ast import Add, Attribute, AugAssign, Dict, Div, Eq, FloorDiv, Gt, GtE, Lt, LtE, Mod, Mult, Name, Assign, Constant, AST, FunctionDef, If, Module, Call, Not, NotEq, Pow, Return, For, Set, Slice, Sub, Subscript, UnaryOp, While, Compare, BoolOp, And, Or, BinOp, List
+from ast import stmt, alias, Add, Attribute, AugAssign, Dict, Div, Eq, FloorDiv, Gt, GtE, Import, ImportFrom, Lt, LtE, Mod, Mult, Name, Assign, Constant, AST, FunctionDef, If, Module, Call, Not, NotEq, Pow, Return, For, Set, Slice, Sub, Subscript, UnaryOp, While, Compare, BoolOp, And, Or, BinOp, List
 import builtins
 from exceptions import NotSupported, ToolError, TypeError
-from automata import IterHead, State, BaseType, Biunify, Combine, Function, SetHead, DictHead, ListHead, Record
+from automata import Budget, IterHead, State, BaseType, Biunify, Combine, ErrorType, Function, SetHead, DictHead, ListHead, Record, StatesCreated
 from pretty_printing import PrettyPrint
 from scope import Scope, Variable
+from builtIns import dummyNode
 from types import NoneType
-from copy import deepcopy
+from schemes import MAX_CALLS, CallKey, CallStats, Instantiate, Scheme
+from serialization import DumpVariables, EncodedGraph, Fingerprint, LoadVariables
+from signature_cache import SignatureCache
+from dependencies import DependencyLog
+from fixpoint import MAX_PASSES, LoopFingerprint, LoopStats, OuterFingerprint, Reads, StatementRecord
+import profiling
+import stubs
 
 class TypeVisitor(ast.NodeVisitor):
     # Settings
     skipPrintAndInput : bool = False 
+    signatureCache : SignatureCache | None = None
+    # Variables and scheme graphs of functions inferred by workers, by the
+    # position of their definition, see parallel.py
+    prefetched : dict[tuple[int, int], tuple[bytes, EncodedGraph]] = {}
+    # Records which outer bindings are loaded and which are only called
+    dependencyLog : DependencyLog | None = None
+    # Record the error of a failing statement and go on with the next one
+    recover : bool = False
+    # Limits of the file being checked, see CheckTree
+    budget : Budget | None = None
 
     # static variables
     inFunction: bool = False
-    returnState : State | None
+    returnState : State | None = None
     typedVariables : list[Variable] = []
+    errors : list[ToolError] = []
+    loopStats : LoopStats = LoopStats()
+    callStats : CallStats = CallStats()
+
+    @staticmethod
+    def Reset():
+        TypeVisitor.inFunction = False
+        TypeVisitor.returnState = None
+        TypeVisitor.typedVariables = []
+        TypeVisitor.errors = []
+        TypeVisitor.loopStats = LoopStats()
+        TypeVisitor.callStats = CallStats()
 
     def __init__(self, upperScope : Scope):
         self.upperScope : Scope = upperScope
@@ -30,14 +59,162 @@ class TypeVisitor(ast.NodeVisitor):
     #### Helper functions ####
 
     def Load(self, name : str) -> State:
-        if self.scope.Contains(name):
-            return self.scope.Get(name).state
-        return self.upperScope.Get(name).state
+        variable = self.scope.Find(name) or self.upperScope.Get(name)
+        if TypeVisitor.dependencyLog is not None:
+            TypeVisitor.dependencyLog.Load(name, variable)
+        return variable.state
+
+    def Use(self, name : str) -> State:
+        # Builtin states are shared templates, so every use gets its own copy
+        variable = self.scope.Find(name) or self.upperScope.Get(name)
+        if TypeVisitor.dependencyLog is not None:
+            TypeVisitor.dependencyLog.Load(name, variable)
+            TypeVisitor.dependencyLog.Read(name, variable)
+        if variable.node is dummyNode:
+            return Instantiate(variable.state)
+        return variable.state
+
+    def Lookup(self, name : str) -> Variable | None:
+        return self.scope.Find(name) or self.upperScope.Find(name)
 
     def Store(self, name : str, variable : Variable):
         TypeVisitor.typedVariables.append(variable)
         self.scope.Add(name, variable)
 
+    def VisitStatement(self, statement : stmt):
+        if not TypeVisitor.recover:
+            self.visit(statement)
+            return
+        depth = len(self.stack)
+        try:
+            self.visit(statement)
+        except ToolError as e:
+            del self.stack[depth:]
+            self.Recover(statement, e)
+
+    def Report(self, statement : stmt, error : ToolError):
+        # Errors without a position are reported at the failing statement
+        if not hasattr(error.node, "lineno"):
+            error = TypeError(statement, error.message)
+        TypeVisitor.errors.append(error)
+
+    def Recover(self, statement : stmt, error : ToolError):
+        self.Report(statement, error)
+        if type(statement) == Return and TypeVisitor.returnState is not None:
+            # The function still returns here, callers get the error type
+            state = State(True)
+            state.heads.add(ErrorType())
+            Biunify(state, TypeVisitor.returnState)
+            self.returnVisited = True
+        for (name, node) in BoundNames(statement).items():
+            state = State(True)
+            state.heads.add(ErrorType())
+            self.Store(name, Variable(name, node, state))
+
+    def VisitTest(self, node : If | While | For, test : AST, expected : State) -> bool:
+        # In recovery mode a failing test is reported and the body of the
+        # statement is still checked. False when the test failed.
+        depth = len(self.stack)
+        try:
+            self.visit(test)
+            try:
+                Biunify(self.stack.pop(), expected)
+            except Exception as e:
+                raise TypeError(node, e.args[0])
+        except ToolError as e:
+            if not TypeVisitor.recover:
+                raise
+            del self.stack[depth:]
+            self.Report(node, e)
+            return False
+        return True
+
+    def VisitRecorded(self, statement : stmt) -> StatementRecord:
+        bindings = len(self.scope.mapping)
+        variables = len(TypeVisitor.typedVariables)
+        errors = len(TypeVisitor.errors)
+        self.VisitStatement(statement)
+        return StatementRecord(statement, self.scope.mapping[bindings:], TypeVisitor.typedVariables[variables:], TypeVisitor.errors[errors:], self.returnVisited)
+
+    def Replay(self, record : StatementRecord):
+        for (name, variable) in record.bindings:
+            self.scope.Add(name, variable)
+        TypeVisitor.typedVariables.extend(record.variables)
+        TypeVisitor.errors.extend(record.errors)
+        self.returnVisited = record.returned
+
+    def InferLoop(self, visitorClass : "type[TypeVisitor]", body : list[stmt], target : Variable | None = None, loop : While | None = None) -> "TypeVisitor":
+        # Infers the body until the bindings it carries to the next iteration
+        # and the outer states it reads stop gaining labels, see fixpoint.py.
+        # The next pass sees the union of the binding before the loop and the
+        # ones after earlier passes. The test of a while loop is checked by
+        # every pass before the body, with the bindings carried around.
+        stats = TypeVisitor.loopStats
+        stats.loops += 1
+        outer = Scope.CombineScopes(self.upperScope, self.scope)
+        firstUid = StatesCreated() + 1
+        firstTyped = len(TypeVisitor.typedVariables)
+        firstError = len(TypeVisitor.errors)
+        records : list[StatementRecord | None] = [None] * len(body)
+        entries : dict[str, Variable] = {}
+        labels : dict[str, frozenset] = {}
+        changed : set[str] | None = None
+        # Builtins are instantiated by every use, the body cannot change them
+        reads : dict[str, tuple[State, frozenset]] = {}
+        for name in set().union(*map(Reads, body), Reads(loop.test) if loop is not None else ()):
+            variable = outer.Find(name)
+            if variable is not None and variable.node is not dummyNode:
+                reads[name] = (variable.state, OuterFingerprint(variable.state, firstUid))
+        for passes in range(1, MAX_PASSES + 1):
+            stats.passes += 1
+            del TypeVisitor.typedVariables[firstTyped:]
+            del TypeVisitor.errors[firstError:]
+            entryScope = Scope(outer)
+            for (name, variable) in entries.items():
+                entryScope.Add(name, variable)
+            visitor = visitorClass(entryScope)
+            if target is not None:
+                visitor.Store(target.name, target)
+            if loop is not None:
+                booleanType = State(False)
+                booleanType.heads.add(BaseType("bool"))
+                visitor.VisitTest(loop, loop.test, booleanType)
+            for (i, statement) in enumerate(body):
+                if visitor.returnVisited:
+                    break
+                record = records[i]
+                if changed is not None and record is not None and changed.isdisjoint(record.Reads()):
+                    visitor.Replay(record)
+                    changed.difference_update(name for (name, _) in record.bindings)
+                    stats.replayed += 1
+                else:
+                    records[i] = visitor.VisitRecorded(statement)
+                    if changed is not None:
+                        changed.update(BoundNames(statement))
+                    stats.visited += 1
+
+            changed = set()
+            for (name, variable) in visitor.scope.bindings.items():
+                before = entries.get(name) or self.Lookup(name)
+                if before is None or before is variable:
+                    continue
+                if name not in labels:
+                    labels[name] = LoopFingerprint(before.state, firstUid)
+                grown = LoopFingerprint(variable.state, firstUid)
+                if not grown <= labels[name]:
+                    labels[name] |= grown
+                    changed.add(name)
+                    entries[name] = Variable(name, before.node, Combine(before.state, variable.state))
+            for (name, (state, known)) in reads.items():
+                grown = OuterFingerprint(state, firstUid)
+                if not grown <= known:
+                    reads[name] = (state, known | grown)
+                    changed.add(name)
+            if not changed:
+                return visitor
+        stats.capped += 1
+        return visitor
+
     def CallFunction(self, function : State, arguments: list[State])->State:
         tmpFunction = State(False)
         pResult = State(True)
@@ -51,6 +228,31 @@ class TypeVisitor(ast.NodeVisitor):
         Biunify(function, tmpFunction)
         return pResult
 
+    def Call(self, callee : State, arguments: list[State])->State:
+        if callee.scheme is None:
+            return self.CallFunction(Instantiate(callee), arguments)
+        return self.CallScheme(callee.scheme, arguments)
+
+    def CallScheme(self, scheme : Scheme, arguments: list[State])->State:
+        # A call with concrete arguments whose result only has base types
+        # gives that result for every call with arguments of the same types
+        key = CallKey(arguments, TypeVisitor.inFunction)
+        if key is not None:
+            heads = scheme.calls.get(key)
+            if heads is not None:
+                TypeVisitor.callStats.hits += 1
+                result = State(True)
+                result.heads.update(heads)
+                return result
+            TypeVisitor.callStats.misses += 1
+        result = self.CallFunction(scheme.Instantiate(), arguments)
+        if key is not None and len(scheme.calls) < MAX_CALLS:
+            heads = frozenset(result.heads)
+            if all(type(h) == BaseType for h in heads):
+                scheme.calls[key] = heads
+                TypeVisitor.callStats.stored += 1
+        return result
+
     def HandleSpecialCalls(self, node: Call, arguments: list[State])->bool:
         if type(node.func) == Name:
             name = node.func.id
@@ -85,9 +287,14 @@ class TypeVisitor(ast.NodeVisitor):
                 iterHead.fields["values"].heads.add(BaseType("int"))
                 self.stack.append(iterState)
                 return True
+        # Methods of containers, functions with these names are called as usual
+        if type(node.func) != Attribute:
+            return False
+        if name in ("append", "add", "update") and len(arguments) != 1:
+            raise TypeError(node, "{} takes exactly one argument".format(name))
+        match name:
             case "extend":
-                self.VisitExtend(node.func, arguments) #type: ignore
-                return True
+                raise NotSupported(node, "extend")
             case "append":
                 self.VisitAppend(node.func, arguments)  #type: ignore
                 return True
@@ -110,6 +317,9 @@ class TypeVisitor(ast.NodeVisitor):
         newListState.AddAll(listState)
 
         for h in newListState.heads:
+            if type(h) == ErrorType:
+                self.Store(node.value.id, Variable(node.value.id, node.value, newListState)) #type: ignore
+                return
             if type(h) == ListHead:
                 h.fields["values"].AddAll(toAddState)
                 self.Store(node.value.id, Variable(node.value.id, node.value, newListState)) #type: ignore
@@ -127,6 +337,9 @@ class TypeVisitor(ast.NodeVisitor):
         newSetState.AddAll(setState)
 
         for h in newSetState.heads:
+            if type(h) == ErrorType:
+                self.Store(node.value.id, Variable(node.value.id, node.value, newSetState)) #type: ignore
+                return
             if type(h) == SetHead:
                 h.fields["values"].AddAll(toAddState)
                 self.Store(node.value.id, Variable(node.value.id, node.value, newSetState)) #type: ignore
@@ -144,6 +357,9 @@ class TypeVisitor(ast.NodeVisitor):
         toMergeState = arguments[0]
 
         for h1 in newDictState.heads:
+            if type(h1) == ErrorType:
+                self.Store(node.value.id, Variable(node.value.id, node.value, newDictState)) #type: ignore
+                return
             if type(h1) == DictHead:
                 for h2 in toMergeState.heads:
                     if type(h2) == DictHead:
@@ -153,34 +369,88 @@ class TypeVisitor(ast.NodeVisitor):
                         return
         raise TypeError(node, "Can only update a dictionairy.")
 
+    def ModuleMember(self, node: AST) -> Scheme | None:
+        # Members of a module bound by "import" come from the stub library
+        if type(node) != Attribute or type(node.value) != Name:
+            return None
+        variable = self.Lookup(node.value.id)
+        if variable is None or type(variable.node) != alias or BaseType("module") not in variable.state.heads:
+            return None
+        if TypeVisitor.dependencyLog is not None:
+            TypeVisitor.dependencyLog.Load(node.value.id, variable)
+            TypeVisitor.dependencyLog.Call(variable.state)
+        module = stubs.Library().Module(variable.node.name)
+        scheme = module.Member(node.attr) if module else None
+        if scheme is None:
+            raise TypeError(node, "Module {} has no member {}".format(variable.node.name, node.attr))
+        return scheme
+
+    def SignatureKey(self, node: FunctionDef) -> str | None:
+        # A function only sees the bindings visible at its definition, so its
+        # source and the types of the free names it loads determine its type.
+        # Taking a signature skips the body and with it the Biunify of the
+        # body with outer states, so only functions that cannot change them
+        # have a key: their free names are builtins, modules, or schemes
+        # that are only called and so instantiated. None for the others.
+        parts : list[str] = [ast.dump(node), str(TypeVisitor.skipPrintAndInput)]
+        params: set[str] = {arg.arg for arg in node.args.args}
+        (names, values) = FreeNames(node)
+        for name in sorted(names - params):
+            variable = self.Lookup(name)
+            if variable is None or variable.node is dummyNode:
+                continue
+            if type(variable.node) == alias and variable.state.scheme is None:
+                parts.append("{}={}".format(name, Fingerprint([variable.state])))
+                continue
+            if variable.state.scheme is None or name in values:
+                return None
+            if type(variable.node) == alias:
+                # Imported names are identified by their stubs
+                parts.append("{}={}".format(name, variable.state.scheme.signature))
+                continue
+            parts.append("{}={}".format(name, Fingerprint([variable.state])))
+        return SignatureCache.Key(parts)
+
     ### Visitors ###
 
     def visit(self, node: AST):
         if not self.returnVisited:
-            return super().visit(node)
+            budget = TypeVisitor.budget
+            if budget is not None:
+                budget.Tick()
+            profiler = profiling.profiler
+            if profiler is None:
+                return super().visit(node)
+            profiler.Enter("visit " + node.__class__.__name__)
+            try:
+                return super().visit(node)
+            finally:
+                profiler.Exit()
 
     def generic_visit(self, node: AST):
         if not self.returnVisited:
             return super().generic_visit(node)
 
+    def visit_Module(self, node: Module):
+        for statement in node.body:
+            if self.returnVisited:
+                break
+            self.VisitStatement(statement)
+
     #### Statements ####
 
     def visit_Assign(self, node: Assign):
         self.visit(node.value)
         rhsState : State = self.stack.pop()
         for target in node.targets:
+            if type(target) != Name:
+                raise NotSupported(target, "assignment to {}".format(type(target).__name__))
             self.Store(target.id, Variable(target.id, target, rhsState)) #type: ignore
 
     def visit_If(self, node: If):
-        self.visit(node.test)
-        conditionType = self.stack.pop()
         booleanType : State = State(False) 
         booleanType.heads.add(BaseType("bool"))
-
-        try:
-            Biunify(conditionType, booleanType)
-        except Exception as e:
-            raise TypeError(node, e.args[0])
+        self.VisitTest(node, node.test, booleanType)
 
         thenVisitor = ThenElseVisitor(Scope.CombineScopes(self.upperScope, self.scope))
         thenVisitor.InferTypes(Module(node.body))
@@ -209,6 +479,35 @@ class TypeVisitor(ast.NodeVisitor):
             
 
     def visit_FunctionDef(self, node: FunctionDef):
+        prefetched = TypeVisitor.prefetched.get((node.lineno, node.col_offset))
+        if prefetched is not None:
+            # The worker saw the same bindings and simplified the scheme
+            (data, graph) = prefetched
+            variables = LoadVariables(data, node)
+            TypeVisitor.typedVariables.extend(variables)
+            variables[0].state.scheme = Scheme.FromGraph(graph)
+            self.scope.Add(node.name, variables[0])
+            return
+        cache = TypeVisitor.signatureCache
+        key = self.SignatureKey(node) if cache else None
+        if key is not None:
+            variables : list[Variable] | None = None
+            data = cache.Get(key) #type: ignore
+            if data is not None:
+                # Corrupt entries are dropped, TypeError here is the checker's own
+                try:
+                    variables = LoadVariables(data, node)
+                except (ValueError, EOFError, builtins.TypeError, IndexError, KeyError):
+                    cache.Discard(key) #type: ignore
+            if variables is not None:
+                TypeVisitor.typedVariables.extend(variables)
+                variables[0].state.scheme = Scheme(variables[0].state)
+                self.scope.Add(node.name, variables[0])
+                if TypeVisitor.dependencyLog is not None:
+                    TypeVisitor.dependencyLog.complete = False
+                return
+        firstTyped = len(TypeVisitor.typedVariables)
+
         functionVisitor  = FunctionVisitor(Scope.CombineScopes(self.upperScope, self.scope))
         functionVariable = Variable(node.name, node, State(True))
         TypeVisitor.typedVariables.append(functionVariable)
@@ -229,10 +528,48 @@ class TypeVisitor(ast.NodeVisitor):
         pState.AddFlow(nState)# Negative --> Positive
         functionHead.result     = pState
         TypeVisitor.returnState = nState
-        functionVisitor.InferTypes(Module(node.body))
-        TypeVisitor.returnState = None
+        errors = len(TypeVisitor.errors)
+        profiler = profiling.profiler
+        if profiler is not None:
+            profiler.Enter("function " + node.name)
+        try:
+            functionVisitor.InferTypes(Module(node.body))
+        finally:
+            TypeVisitor.returnState = None
+            if profiler is not None:
+                profiler.Exit()
 
+        functionVariable.state.scheme = Scheme(functionVariable.state)
         self.scope.Add(node.name, functionVariable)
+        # Cache hits report no errors, so only clean definitions are stored
+        if cache and key is not None and len(TypeVisitor.errors) == errors:
+            data = DumpVariables(TypeVisitor.typedVariables[firstTyped:], node)
+            if data is not None:
+                cache.Put(key, data)
+
+    def visit_Import(self, node: Import):
+        for name in node.names:
+            module = stubs.Library().Module(name.name)
+            if module is None:
+                raise NotSupported(name, "module {}".format(name.name))
+            boundName = name.asname or name.name
+            self.scope.Add(boundName, Variable(boundName, name, module.State()))
+
+    def visit_ImportFrom(self, node: ImportFrom):
+        module = stubs.Library().Module(node.module) if node.module and not node.level else None
+        if module is None:
+            raise NotSupported(node, "module {}{}".format("." * node.level, node.module or ""))
+        for name in node.names:
+            members = module.Members() if name.name == "*" else [name.name]
+            for member in members:
+                scheme = module.Member(member)
+                if scheme is None:
+                    raise TypeError(name, "Module {} has no member {}".format(module.name, member))
+                # Bound like a definition, every call instantiates the scheme
+                state = scheme.Instantiate()
+                state.scheme = scheme
+                boundName = name.asname or member
+                self.scope.Add(boundName, Variable(boundName, name, state))
 
     def visit_Return(self, node: Return):
         if not TypeVisitor.inFunction:
@@ -256,18 +593,7 @@ class TypeVisitor(ast.NodeVisitor):
         self.returnVisited : bool = True
 
     def visit_While(self, node: While):
-        self.visit(node.test)
-        conditionType = self.stack.pop()
-        booleanType : State = State(False) 
-        booleanType.heads.add(BaseType("bool"))
-
-        try:
-            Biunify(conditionType, booleanType)
-        except Exception as e:
-            raise TypeError(node, e.args[0])
-
-        whileVisitor = WhileLoopVisitor(Scope.CombineScopes(self.upperScope, self.scope))
-        whileVisitor.InferTypes(Module(node.body))
+        whileVisitor = self.InferLoop(WhileLoopVisitor, node.body, loop=node)
         whileScope: Scope = whileVisitor.scope
 
         for name in whileScope.GetBoundNames():
@@ -284,24 +610,18 @@ class TypeVisitor(ast.NodeVisitor):
             self.scope.Add(name, variable)
 
     def visit_For(self, node: For):
-        self.visit(node.iter)
-        iterState: State = self.stack.pop()
         tempIterState: State = State(False)
         iterHead: IterHead = IterHead(False)
         tempIterState.heads.add(iterHead)
         pState = State(True)
         pState.AddFlow(iterHead.fields["values"])
+        if not self.VisitTest(node, node.iter, tempIterState):
+            pState.heads.add(ErrorType())
 
-        try:
-            Biunify(iterState, tempIterState)
-        except Exception as e:
-            raise TypeError(node, e.args[0])
-
-        forVisitor = ForLoopVisitor(Scope.CombineScopes(self.upperScope, self.scope))
         target: Name = node.target #type: ignore
-        forVisitor.Store(target.id, Variable(target.id, target, pState))
-        
-        forVisitor.InferTypes(Module(node.body))
+        if type(target) != Name:
+            raise NotSupported(target, "loop target {}".format(type(target).__name__))
+        forVisitor = self.InferLoop(ForLoopVisitor, node.body, Variable(target.id, target, pState))
         forScope: Scope = forVisitor.scope
 
         for name in forScope.GetBoundNames():
@@ -318,20 +638,28 @@ class TypeVisitor(ast.NodeVisitor):
             self.scope.Add(name, variable)
 
     def visit_AugAssign(self, node: AugAssign):
+        target = node.target
+        if type(target) != Name:
+            raise NotSupported(target, "assignment to {}".format(type(target).__name__))
         self.visit(node.target)
         lhs : State =self.stack.pop()
         self.visit(node.value)
         rhs : State = self.stack.pop()
         self.visit(node.op)
         function: State = self.stack.pop()
-        result: State = self.CallFunction(function, [lhs, rhs])
-        target = node.target
+        try:
+            result: State = self.Call(function, [lhs, rhs])
+        except Exception as e:
+            raise TypeError(node, str(e))
         self.Store(target.id, Variable(target.id, target, result)) #type: ignore
 
     #### Expressions ####
 
     def visit_Name(self, node: Name):
-        state : State = self.Load(node.id)
+        try:
+            state : State = self.Use(node.id)
+        except Exception as e:
+            raise TypeError(node, str(e))
         self.stack.append(state)
 
     def visit_Constant(self, node: Constant):
@@ -360,16 +688,30 @@ class TypeVisitor(ast.NodeVisitor):
         if self.HandleSpecialCalls(node, arguments):
             return
 
-        self.visit(node.func)
-        function: State = deepcopy(self.stack.pop())
+        member = self.ModuleMember(node.func)
+        if member is None:
+            if type(node.func) == Name:
+                try:
+                    callee = self.Load(node.func.id)
+                except Exception as e:
+                    raise TypeError(node.func, str(e))
+            else:
+                self.visit(node.func)
+                callee = self.stack.pop()
+            if TypeVisitor.dependencyLog is not None:
+                TypeVisitor.dependencyLog.Call(callee)
 
         try:
-            result = self.CallFunction(function, arguments)
+            result = self.CallScheme(member, arguments) if member is not None else self.Call(callee, arguments)
         except Exception as e:
             raise TypeError(node, str(e))
         self.stack.append(result)
 
     def visit_Attribute(self, node: Attribute):
+        member = self.ModuleMember(node)
+        if member is not None:
+            self.stack.append(member.Instantiate())
+            return
         self.visit(node.value)
         RecState: State = self.stack.pop()
         attribute: str = node.attr
@@ -398,7 +740,7 @@ class TypeVisitor(ast.NodeVisitor):
         arguments.append(self.stack.pop())
 
         try:
-            result = self.CallFunction(function, arguments)
+            result = self.Call(function, arguments)
         except Exception as e:
             raise TypeError(node, str(e))
         self.stack.append(result)
@@ -414,7 +756,7 @@ class TypeVisitor(ast.NodeVisitor):
         arguments.append(self.stack.pop())
 
         try:
-            result = self.CallFunction(function, arguments)
+            result = self.Call(function, arguments)
         except Exception as e:
             raise TypeError(node, str(e))
         self.stack.append(result)
@@ -426,7 +768,7 @@ class TypeVisitor(ast.NodeVisitor):
         arguments : list[State] = [self.stack.pop()]
 
         try:
-            result = self.CallFunction(function, arguments)
+            result = self.Call(function, arguments)
         except Exception as e:
             raise TypeError(node, str(e))
         self.stack.append(result)
@@ -442,7 +784,7 @@ class TypeVisitor(ast.NodeVisitor):
         arguments.append(self.stack.pop())
 
         try:
-            result = self.CallFunction(function, arguments)
+            result = self.Call(function, arguments)
         except Exception as e:
             raise TypeError(node, str(e))
         self.stack.append(result)
@@ -510,6 +852,7 @@ class TypeVisitor(ast.NodeVisitor):
         self.stack.append(result)
 
     ### Operations ###
+    # Operators push the builtin templates, Call instantiates their schemes
 
     def visit_Eq(self, node: Eq):
         self.stack.append(self.Load("=="))
@@ -639,17 +982,17 @@ class FunctionVisitor(TypeVisitor):
 
     def InferTypes(self, tree: AST):
         TypeVisitor.inFunction = True
-
-        super().InferTypes(tree)
-        if not self.returnVisited and TypeVisitor.returnState:
-            state : State = State(True)
-            state.heads.add(BaseType("none"))
-            try:
-                Biunify(state, TypeVisitor.returnState)
-            except Exception as e:
-                raise TypeError(tree, e.args[0]) #type: ignore
-        
-        TypeVisitor.inFunction = False
+        try:
+            super().InferTypes(tree)
+            if not self.returnVisited and TypeVisitor.returnState:
+                state : State = State(True)
+                state.heads.add(BaseType("none"))
+                try:
+                    Biunify(state, TypeVisitor.returnState)
+                except Exception as e:
+                    raise TypeError(tree, e.args[0]) #type: ignore
+        finally:
+            TypeVisitor.inFunction = False
 
     def visit_FunctionDef(self, node: FunctionDef):
         raise TypeError(node, "Cannot define a function within a function definition")
@@ -674,3 +1017,28 @@ class ForLoopVisitor(TypeVisitor):
 
     def visit_FunctionDef(self, node: FunctionDef):
         raise TypeError(node, "Cannot define a function in a for-loop")
+
+def BoundNames(statement : stmt) -> dict[str, AST]:
+    # Names a statement binds, with the node of their first binding
+    if type(statement) == FunctionDef:
+        return {statement.name: statement}
+    if type(statement) in (Import, ImportFrom):
+        return {name.asname or name.name: name for name in statement.names if name.name != "*"} #type: ignore
+    names : dict[str, AST] = {}
+    for node in ast.walk(statement):
+        if type(node) == Name and type(node.ctx) == ast.Store:
+            names.setdefault(node.id, node)
+    return names
+
+def FreeNames(node : FunctionDef) -> tuple[set[str], set[str]]:
+    # Names a function loads, and those of them it uses other than by
+    # calling them directly
+    callees : set[int] = {id(n.func) for n in ast.walk(node) if type(n) == Call}
+    names : set[str] = set()
+    values : set[str] = set()
+    for n in ast.walk(node):
+        if type(n) == Name and isinstance(n.ctx, ast.Load):
+            names.add(n.id)
+            if id(n) not in callees:
+                values.add(n.id)
+    return (names, values)